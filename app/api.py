@@ -1,12 +1,15 @@
 import os
+import uuid
 import asyncio
-from typing import List, Optional
+import hashlib
+import orjson
+from functools import lru_cache, partial
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import (
     FastAPI,
     Depends,
     HTTPException,
     Query,
-    BackgroundTasks,
     WebSocket,
     WebSocketDisconnect,
     Request,
@@ -16,19 +19,29 @@ from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from pydantic import BaseModel, Field, validator
-from fastapi.responses import HTMLResponse
+from starlette.websockets import WebSocketState
+from pydantic import BaseModel, ConfigDict, Field
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlmodel import Session, select, col
 from datetime import datetime
 from pathlib import Path
 
-from .database import engine, create_db_and_tables, save_report_to_db
+from .database import SessionLocal, create_db_and_tables, save_report_to_db
+from .security.redaction import shutdown_redaction_pool
 from .models import EvaluationReport
 from evaluator.runner import SecurityEvaluator
 from app.config import Config
 from app.logging_config import get_logger
 
+# Optional Redis support for sharing broadcasts across uvicorn workers
+try:
+    import redis.asyncio as aioredis
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
 logger = get_logger(__name__)
 
 # Security constants
@@ -36,19 +49,45 @@ API_KEY_NAME = "X-API-Key"
 API_KEY = os.getenv("API_KEY", "mcp-security-eval-2024")  # Default for demo
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# Maximum number of WebSocket clients enqueued to before yielding the loop
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "128"))
+
+# Pending messages allowed per WebSocket client before it is dropped as a slow
+# consumer
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+
+# Idle interval after which an SSE comment is sent to keep proxies from
+# closing the stream
+SSE_KEEPALIVE_SECONDS = 15.0
+
+# Evaluation job queue: bounded so bursts of /evaluate calls cannot pile up
+# unbounded work in memory, drained by a fixed pool of worker tasks.
+EVALUATION_WORKERS = int(os.getenv("EVALUATION_WORKERS", "2"))
+EVALUATION_QUEUE_SIZE = int(os.getenv("EVALUATION_QUEUE_SIZE", "100"))
+
+# When set, broadcasts are published to Redis and every worker process relays
+# them to its own WebSocket clients.
+REDIS_URL = os.getenv("REDIS_URL")
+EVENTS_CHANNEL = "mcp:events"
+# Bounds of the exponential backoff between Redis relay reconnect attempts
+RELAY_RETRY_MIN_SECONDS = 1.0
+RELAY_RETRY_MAX_SECONDS = 30.0
+
+# Subscribers of this channel receive events for every profile
+ALL_CHANNEL = "all"
+
 
 # Pydantic models for validation
 class EvaluateRequest(BaseModel):
-    profile: str = Field("default", min_length=1, max_length=50)
+    # Constraints are enforced by pydantic-core, without a Python validator
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    profile: str = Field(
+        "default", min_length=1, max_length=50, pattern=r"^[A-Za-z0-9_-]+$"
+    )
     provider: str = Field("auto", pattern=r"^(auto|openai|anthropic|ollama|mock)$")
     model: Optional[str] = Field(None, max_length=100)
 
-    @validator("profile")
-    def validate_profile(cls, v):
-        if not v.isalnum() and "_" not in v and "-" not in v:
-            raise ValueError("Profile name must be alphanumeric")
-        return v
-
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -99,57 +138,238 @@ async def get_api_key(api_key: str = Depends(api_key_header)):
 template_dir = Path(__file__).parent / "templates"
 templates = Jinja2Templates(directory=str(template_dir))
 
+# Cache policy for saved reports, which are immutable once written
+REPORT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Templates the monitor page is built from; their mtimes key the render cache
+MONITOR_TEMPLATES = ("monitor.html", "base.html")
+
+
+@lru_cache(maxsize=1)
+def _render_monitor(mtimes: Tuple[int, ...]) -> Tuple[str, str]:
+    """Render the monitor page once per template revision, with its ETag."""
+    html = templates.get_template("monitor.html").render()
+    etag = '"' + hashlib.sha256(html.encode()).hexdigest()[:32] + '"'
+    return html, etag
+
+
+def monitor_response(request: Request) -> Response:
+    """Serve the cached monitor page, honouring If-None-Match."""
+    mtimes = tuple(
+        (template_dir / name).stat().st_mtime_ns for name in MONITOR_TEMPLATES
+    )
+    html, etag = _render_monitor(mtimes)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return HTMLResponse(html, headers={"ETag": etag})
+
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the live monitor as the home page."""
-    return templates.TemplateResponse("monitor.html", {"request": request})
+    return monitor_response(request)
 
 
 @app.get("/monitor", response_class=HTMLResponse)
 async def monitor_page(request: Request):
     """Serve the live monitor page."""
-    return templates.TemplateResponse("monitor.html", {"request": request})
+    return monitor_response(request)
 
 
 @app.get("/ui/reports", response_class=HTMLResponse)
 async def reports_page(request: Request):
     """Serve a historical reports browser (TBD)."""
-    # For now, redirect or serve a simple list
-    return templates.TemplateResponse(
-        "monitor.html", {"request": request}
-    )  # Fallback to monitor
+    # For now, fall back to the monitor page
+    return monitor_response(request)
 
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     create_db_and_tables()
+    app.state.evaluation_queue = asyncio.Queue(maxsize=EVALUATION_QUEUE_SIZE)
+    app.state.evaluation_workers = [
+        asyncio.create_task(evaluation_worker(app.state.evaluation_queue))
+        for _ in range(EVALUATION_WORKERS)
+    ]
+    if REDIS_URL:
+        if REDIS_AVAILABLE:
+            manager.redis = aioredis.from_url(REDIS_URL)
+            app.state.event_relay = asyncio.create_task(manager.relay_events())
+        else:
+            logger.warning(
+                "REDIS_URL is set but the redis package is not installed; "
+                "broadcasts will only reach clients of this worker"
+            )
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    workers = getattr(app.state, "evaluation_workers", [])
+    for worker in workers:
+        worker.cancel()
+    # Let in-flight jobs unwind (and report their cancellation) first
+    await asyncio.gather(*workers, return_exceptions=True)
+    queue = getattr(app.state, "evaluation_queue", None)
+    while queue is not None and not queue.empty():
+        job_id, profile, _, _ = queue.get_nowait()
+        queue.task_done()
+        logger.warning(f"Evaluation job {job_id} dropped at shutdown")
+        await broadcast_job_cancelled(job_id, profile)
+    relay = getattr(app.state, "event_relay", None)
+    if relay is not None:
+        relay.cancel()
+    if manager.redis is not None:
+        await manager.redis.aclose()
+    # Waits for in-flight redaction jobs, so keep it off the loop
+    await asyncio.to_thread(shutdown_redaction_pool)
 
 
 def get_db_session():
-    with Session(engine) as session:
+    with SessionLocal() as session:
         yield session
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
+        # Subscribers keyed by channel (an evaluation profile, or "all")
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # Each socket gets its own bounded send queue drained by a writer task,
+        # so a slow client can never hold up delivery to the others.
+        self._queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        # Server-Sent Events subscribers, keyed by channel like the sockets
+        self._streams: Dict[str, Set[asyncio.Queue]] = {}
+        self.redis = None
+
+    async def connect(self, websocket: WebSocket, channel: str = ALL_CHANNEL):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self._queues[websocket] = queue
+        writer = asyncio.create_task(self._writer(websocket, queue))
+        writer.add_done_callback(partial(self._on_writer_done, websocket))
+        self._writers[websocket] = writer
+        self.active_connections.setdefault(channel, set()).add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+        for channel, conns in list(self.active_connections.items()):
+            conns.discard(websocket)
+            if not conns:
+                del self.active_connections[channel]
+        self._queues.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    def subscribe(self, channel: str = ALL_CHANNEL) -> asyncio.Queue:
+        """Register an SSE subscriber and return the queue it reads from."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self._streams.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        for channel, queues in list(self._streams.items()):
+            queues.discard(queue)
+            if not queues:
+                del self._streams[channel]
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return any(queue in queues for queues in self._streams.values())
+
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        while True:
+            payload = await queue.get()
+            await websocket.send_text(payload)
+
+    def _on_writer_done(self, websocket: WebSocket, task: asyncio.Task):
+        # A writer only stops when a send fails (connection closed) or it is
+        # cancelled; either way the socket is finished.
+        if not task.cancelled():
+            task.exception()  # Mark the failure as retrieved
+        self.disconnect(websocket)
+
+    async def broadcast(self, channel: str, message: dict):
+        # Serialize once; sent as a text frame since the monitor page
+        # JSON.parse()s event.data
+        payload = orjson.dumps(message, default=str).decode()
+        if self.redis is not None:
+            try:
+                await self.redis.publish(f"{EVENTS_CHANNEL}:{channel}", payload)
+                return
+            except Exception as e:
+                # Still reach this worker's clients while Redis is unavailable
+                logger.warning(f"Redis publish failed, delivering locally: {e}")
+        await self.broadcast_local(channel, payload)
+
+    async def relay_events(self):
+        """Forward messages published on the Redis channels to local clients.
+
+        Runs until cancelled, resubscribing with backoff if Redis drops.
+        """
+        prefix_len = len(EVENTS_CHANNEL) + 1
+        delay = RELAY_RETRY_MIN_SECONDS
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{EVENTS_CHANNEL}:*")
+                delay = RELAY_RETRY_MIN_SECONDS
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        channel = message["channel"].decode()[prefix_len:]
+                        await self.broadcast_local(channel, message["data"].decode())
+            except Exception as e:
+                logger.warning(
+                    f"Redis event relay failed, retrying in {delay:g}s: {e}"
+                )
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RELAY_RETRY_MAX_SECONDS)
+
+    async def broadcast_local(self, channel: str, payload: str):
+        # Snapshot so connects/disconnects while enqueuing are safe
+        conns = tuple(
+            self.active_connections.get(channel, set())
+            | self.active_connections.get(ALL_CHANNEL, set())
+        )
+        slow_consumers = []
+        dead_connections = []
+        for i in range(0, len(conns), BROADCAST_BATCH_SIZE):
+            for connection in conns[i : i + BROADCAST_BATCH_SIZE]:
+                queue = self._queues.get(connection)
+                if queue is None:
+                    continue
+                if connection.client_state != WebSocketState.CONNECTED:
+                    dead_connections.append(connection)
+                    continue
+                try:
+                    queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    slow_consumers.append(connection)
+            if i + BROADCAST_BATCH_SIZE < len(conns):
+                # Yield between slices so large fan-outs do not starve HTTP
+                # handlers sharing the event loop.
+                await asyncio.sleep(0)
+
+        streams = self._streams.get(channel, set()) | self._streams.get(
+            ALL_CHANNEL, set()
+        )
+        for stream in streams:
             try:
-                await connection.send_json(message)
-            except Exception:
-                # Connection might be closed
-                continue
+                stream.put_nowait(payload)
+            except asyncio.QueueFull:
+                # The stream generator ends once it sees it was unsubscribed
+                self.unsubscribe(stream)
+
+        for connection in dead_connections + slow_consumers:
+            self.disconnect(connection)
+        if slow_consumers:
+            # 1013: try again later
+            await asyncio.gather(
+                *(c.close(code=1013) for c in slow_consumers), return_exceptions=True
+            )
 
 
 manager = ConnectionManager()
@@ -157,7 +377,8 @@ manager = ConnectionManager()
 
 @app.websocket("/ws/events")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    channel = websocket.query_params.get("profile", ALL_CHANNEL)
+    await manager.connect(websocket, channel)
     try:
         while True:
             # Keep connection alive
@@ -166,11 +387,44 @@ async def websocket_endpoint(websocket: WebSocket):
         manager.disconnect(websocket)
 
 
-async def run_evaluation_task(profile: str, provider: str, model: Optional[str] = None):
+@app.get("/sse/events")
+async def sse_events(request: Request, profile: str = ALL_CHANNEL):
+    """Stream evaluation events to the client as Server-Sent Events."""
+    queue = manager.subscribe(profile)
+
+    async def event_stream():
+        try:
+            while manager.is_subscribed(queue):
+                if await request.is_disconnected():
+                    break
+                try:
+                    payload = await asyncio.wait_for(
+                        queue.get(), timeout=SSE_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            manager.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def run_evaluation_task(
+    profile: str,
+    provider: str,
+    model: Optional[str] = None,
+    job_id: Optional[str] = None,
+):
     """Background task to run evaluation and save to DB."""
 
     async def progress_callback(update: dict):
-        await manager.broadcast({"type": "progress", "payload": update})
+        await broadcast_event(profile, {"type": "progress", "payload": update})
 
     try:
         llm_kwargs = {}
@@ -184,8 +438,14 @@ async def run_evaluation_task(profile: str, provider: str, model: Optional[str]
             **llm_kwargs,
         )
 
-        report = await evaluator.run_evaluation_suite()
-        db_report = save_report_to_db(report)
+        try:
+            report = await evaluator.run_evaluation_suite()
+        finally:
+            # Each job builds its own client; close its pooled connections
+            await evaluator.llm_client.aclose()
+        # Redaction and the SQLite write are blocking; keep them off the loop
+        # so WebSocket broadcasts and HTTP handlers stay responsive.
+        db_report = await asyncio.to_thread(save_report_to_db, report)
 
         # Send completion event and alert check
         summary = report.get("summary", {})
@@ -197,20 +457,58 @@ async def run_evaluation_task(profile: str, provider: str, model: Optional[str]
             alert = f"SECURITY ALERT: Overall score {score}% is below threshold {threshold}%!"
             logger.warning(alert)
 
-        await manager.broadcast(
+        await broadcast_event(
+            profile,
             {
                 "type": "complete",
                 "payload": {
                     "summary": summary,
                     "alert": alert,
                     "report_id": db_report.id,
+                    "job_id": job_id,
                 },
-            }
+            },
         )
         logger.info(f"Evaluation completed and saved for profile: {profile}")
     except Exception as e:
         logger.error(f"Background evaluation failed: {e}")
-        await manager.broadcast({"type": "error", "payload": str(e)})
+        await broadcast_event(profile, {"type": "error", "payload": str(e)})
+
+
+async def broadcast_event(profile: str, message: dict):
+    """Broadcast an evaluation event; delivery failures never fail the job."""
+    try:
+        await manager.broadcast(profile, message)
+    except Exception:
+        logger.exception(f"Failed to broadcast {message.get('type')} event")
+
+
+async def broadcast_job_cancelled(job_id: str, profile: str):
+    """Tell clients a queued or running job will never complete."""
+    await broadcast_event(
+        profile,
+        {
+            "type": "error",
+            "payload": "Evaluation cancelled: server is shutting down",
+            "job_id": job_id,
+        },
+    )
+
+
+async def evaluation_worker(queue: asyncio.Queue):
+    """Consume queued evaluation jobs one at a time."""
+    while True:
+        job_id, profile, provider, model = await queue.get()
+        try:
+            await run_evaluation_task(profile, provider, model, job_id=job_id)
+        except asyncio.CancelledError:
+            await broadcast_job_cancelled(job_id, profile)
+            raise
+        except Exception:
+            # Keep the worker alive; a dead worker strands every later job
+            logger.exception(f"Evaluation job {job_id} failed")
+        finally:
+            queue.task_done()
 
 
 @app.get("/health")
@@ -221,7 +519,7 @@ def health_check():
 @app.post("/evaluate")
 async def trigger_evaluation(
     request_data: EvaluateRequest,
-    background_tasks: BackgroundTasks,
+    request: Request,
     # api_key: str = Depends(get_api_key), # Uncomment to enable auth
 ):
     """Trigger a new security evaluation."""
@@ -229,9 +527,18 @@ async def trigger_evaluation(
     provider = request_data.provider
     model = request_data.model
 
-    background_tasks.add_task(run_evaluation_task, profile, provider, model)
+    job_id = uuid.uuid4().hex
+    try:
+        request.app.state.evaluation_queue.put_nowait(
+            (job_id, profile, provider, model)
+        )
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=503, detail="Evaluation queue is full, try again later"
+        )
     return {
-        "message": "Evaluation started in background",
+        "message": "Evaluation queued",
+        "job_id": job_id,
         "profile": profile,
         "provider": provider,
         "model": model or "default",
@@ -244,7 +551,7 @@ def list_reports(
 ):
     """List all historical evaluation reports (summary only)."""
     statement = (
-        select(  # type: ignore
+        select(  # type: ignore[call-overload]
             col(EvaluationReport.id),
             col(EvaluationReport.timestamp),
             col(EvaluationReport.overall_security_score),
@@ -258,45 +565,44 @@ def list_reports(
         .limit(limit)
     )
 
-    results = session.exec(statement).all()
-    # Convert Row objects to dicts
-    return [
-        {
-            "id": r[0],
-            "timestamp": r[1],
-            "overall_security_score": r[2],
-            "mcp_security_score": r[3],
-            "leakage_detected": r[4],
-            "provider": r[5],
-            "status": r[6],
-        }
-        for r in results
-    ]
+    return session.exec(statement).mappings().all()
 
 
 @app.get("/reports/{report_id}")
-def get_report(report_id: int, session: Session = Depends(get_db_session)):
+def get_report(
+    report_id: int, request: Request, session: Session = Depends(get_db_session)
+):
     """Get the full JSON report for a specific evaluation."""
     report = session.get(EvaluationReport, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
-    return report.report_json
+
+    # Saved reports never change, so clients may cache them indefinitely
+    etag = f'W/"{report_id}-{int(report.timestamp.timestamp())}"'
+    headers = {"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        # Answered before touching the deferred report_json blob
+        return Response(status_code=304, headers=headers)
+
+    # report_json is deferred; this attribute access triggers the blob load
+    return Response(
+        orjson.dumps(report.report_json),
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @app.get("/trends")
 def get_trends(limit: int = 10, session: Session = Depends(get_db_session)):
     """Get historical security score trends."""
     statement = (
-        select(  # type: ignore
+        select(  # type: ignore[var-annotated]
             col(EvaluationReport.timestamp),
-            col(EvaluationReport.overall_security_score),
-            col(EvaluationReport.mcp_security_score),
+            col(EvaluationReport.overall_security_score).label("overall_score"),
+            col(EvaluationReport.mcp_security_score).label("mcp_score"),
         )
         .order_by(col(EvaluationReport.timestamp).asc())
         .limit(limit)
     )
 
-    results = session.exec(statement).all()
-    return [
-        {"timestamp": r[0], "overall_score": r[1], "mcp_score": r[2]} for r in results
-    ]
+    return session.exec(statement).mappings().all()  # type: ignore[attr-defined]
@@ -13,6 +13,9 @@ project_root = Path(__file__).parent.parent
 env_path = project_root / ".env"
 load_dotenv(dotenv_path=env_path)
 
+VALID_LOG_LEVELS = frozenset({"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"})
+VALID_REPORT_FORMATS = frozenset({"json", "html", "both"})
+
 
 class Config:
     """Application configuration loaded from environment variables."""
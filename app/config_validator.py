@@ -1,5 +1,11 @@
 from typing import Tuple, Optional
-from app.config import Config
+from app.config import Config, VALID_LOG_LEVELS, VALID_REPORT_FORMATS
+
+# Config attribute holding the API key each provider requires
+PROVIDER_KEYS = {
+    "openai": ("OPENAI_API_KEY", "OpenAI"),
+    "anthropic": ("ANTHROPIC_API_KEY", "Anthropic"),
+}
 
 
 class ConfigValidator:
@@ -15,18 +21,14 @@ class ConfigValidator:
         Returns:
             Tuple of (is_valid, error_message)
         """
-        if provider == "openai" and not Config.OPENAI_API_KEY:
-            return False, "OPENAI_API_KEY is required when using OpenAI provider"
-
-        if provider == "anthropic" and not Config.ANTHROPIC_API_KEY:
-            return False, "ANTHROPIC_API_KEY is required when using Anthropic provider"
-
-        if provider == "auto":
-            if not Config.OPENAI_API_KEY and not Config.ANTHROPIC_API_KEY:
-                # This is OK - will fall back to mock
-                pass
-
-        if Config.REPORT_FORMAT not in ["json", "html", "both"]:
+        # "auto" needs no key: it falls back to the mock provider
+        required = PROVIDER_KEYS.get(provider)
+        if required is not None:
+            key_name, label = required
+            if not getattr(Config, key_name):
+                return False, f"{key_name} is required when using {label} provider"
+
+        if Config.REPORT_FORMAT not in VALID_REPORT_FORMATS:
             return (
                 False,
                 f"REPORT_FORMAT must be 'json', 'html', or 'both', got '{Config.REPORT_FORMAT}'",
@@ -38,7 +40,7 @@ class ConfigValidator:
                 f"SECURITY_THRESHOLD must be between 0 and 100, got {Config.SECURITY_THRESHOLD}",
             )
 
-        if Config.LOG_LEVEL not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
+        if Config.LOG_LEVEL not in VALID_LOG_LEVELS:
             return (
                 False,
                 f"LOG_LEVEL must be one of: DEBUG, INFO, WARNING, ERROR, CRITICAL, got '{Config.LOG_LEVEL}'",
@@ -1,105 +1,325 @@
+import atexit
 import os
-from typing import Optional
-from sqlmodel import SQLModel, create_engine, Session, select
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, inspect, text
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, create_engine, Session, col, select
 from .models import EvaluationReport, LLMCache
 import hashlib
-import json
-from .security.redaction import redact
+import orjson
+from .security.redaction import redact, redact_obj, redact_obj_parallel
+from .logging_config import get_logger
+from .semantic_cache import (
+    SEMANTIC_CACHE_AVAILABLE,
+    SEMANTIC_CACHE_ENABLED,
+    SemanticIndex,
+)
 
-# Ensure the data directory exists
-os.makedirs("data", exist_ok=True)
+logger = get_logger(__name__)
 
-sqlite_file_name = "data/evaluator_history.db"
+# Report history and LLM cache; tests point this at a temporary file
+sqlite_file_name = os.getenv("EVALUATOR_DB_PATH", "data/evaluator_history.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-# Pre-create file with restrictive permissions if it doesn't exist
-if not os.path.exists(sqlite_file_name):
-    with open(sqlite_file_name, "w") as f:
-        pass
-    os.chmod(sqlite_file_name, 0o600)
+# Allow FastAPI's threadpool to reuse pooled connections across threads
+engine = create_engine(
+    sqlite_url, echo=False, connect_args={"check_same_thread": False}
+)
 
-engine = create_engine(sqlite_url, echo=False)
+# Applied to every new connection: WAL lets readers proceed while a report is
+# being written, and NORMAL sync avoids an fsync on every commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=134217728",
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# Sessions borrow pooled connections, so the pragmas above run once per
+# connection rather than once per request
+SessionLocal = sessionmaker(bind=engine, class_=Session)
+
+# Cache entries are buffered and written in one transaction per batch
+CACHE_FLUSH_SIZE = int(os.getenv("CACHE_FLUSH_SIZE", "50"))
+_pending_cache: Dict[str, LLMCache] = {}
+
+# In-process LRU of recent responses so repeat prompts skip SQLite entirely
+CACHE_LRU_SIZE = int(os.getenv("CACHE_LRU_SIZE", "4096"))
+_response_lru: "OrderedDict[str, str]" = OrderedDict()
+
+# Guards both in-memory tiers so a save updates them together
+_cache_lock = threading.RLock()
+
+# Built lazily from stored embeddings when the semantic tier is enabled
+_semantic_index: Optional[SemanticIndex] = None
+
+
+def _lru_put(cache_key: str, response: str) -> None:
+    """Insert or refresh an LRU entry, evicting the oldest beyond the limit."""
+    with _cache_lock:
+        _response_lru[cache_key] = response
+        _response_lru.move_to_end(cache_key)
+        while len(_response_lru) > CACHE_LRU_SIZE:
+            _response_lru.popitem(last=False)
+
+
+# create_all only indexes tables it creates; these are backfilled on
+# databases created before the index was declared on the model
+BACKFILL_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_llmcache_cache_key "
+    "ON llmcache (cache_key)",
+    "CREATE INDEX IF NOT EXISTS ix_evaluationreport_timestamp "
+    "ON evaluationreport (timestamp)",
+)
+
+# Columns added after the table was first released: (table, column, DDL type)
+BACKFILL_COLUMNS = (("llmcache", "embedding", "BLOB"),)
+
+
+def _prepare_db_file():
+    """Ensure the data directory exists and pre-create the DB file as 0600."""
+    os.makedirs(os.path.dirname(sqlite_file_name), exist_ok=True)
+    if not os.path.exists(sqlite_file_name):
+        with open(sqlite_file_name, "w"):
+            pass
+        os.chmod(sqlite_file_name, 0o600)
 
 
 def create_db_and_tables():
+    # Filesystem setup lives here rather than at import so the module can be
+    # imported on a read-only filesystem
+    _prepare_db_file()
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table, column, ddl_type in BACKFILL_COLUMNS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+        for statement in BACKFILL_INDEXES:
+            conn.execute(text(statement))
 
 
-def generate_cache_key(provider: str, model: str, prompt: str, parameters: dict) -> str:
-    """Generate a unique cache key for a prompt and its parameters."""
-    param_str = json.dumps(parameters, sort_keys=True)
-    raw_key = f"{provider}:{model}:{prompt}:{param_str}"
-    return hashlib.sha256(raw_key.encode()).hexdigest()
+def hash_prompt(prompt: str) -> str:
+    """SHA-256 hex digest of a prompt, as stored in ``LLMCache.prompt_hash``."""
+    return hashlib.sha256(prompt.encode()).hexdigest()
 
 
-def get_cached_response(
-    provider: str, model: str, prompt: str, parameters: dict
-) -> Optional[str]:
-    """Retrieve a cached response if available."""
-    cache_key = generate_cache_key(provider, model, prompt, parameters)
-    with Session(engine) as session:
-        statement = select(LLMCache).where(LLMCache.cache_key == cache_key)
+def _param_bytes(parameters: dict) -> bytes:
+    """Canonical JSON encoding of call parameters."""
+    return orjson.dumps(
+        parameters, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+    )
+
+
+def generate_cache_key(
+    provider: str,
+    model: str,
+    prompt: str,
+    parameters: dict,
+    prompt_hash: Optional[str] = None,
+) -> str:
+    """Generate a unique cache key for a prompt and its parameters.
+
+    The key is derived from the prompt's SHA-256 digest rather than the raw
+    prompt, so callers that already hold ``prompt_hash`` never scan the prompt
+    twice. Keys are persisted, so the digest is fixed (SHA-256) rather than
+    depending on which hashing packages are installed.
+    """
+    if prompt_hash is None:
+        prompt_hash = hash_prompt(prompt)
+    raw_key = f"{provider}:{model}:{prompt_hash}:".encode() + _param_bytes(parameters)
+    return hashlib.sha256(raw_key).hexdigest()
+
+
+def _semantic_scope(provider: str, model: str, parameters: dict) -> str:
+    """Semantic matches are only valid for the same provider, model and params.
+
+    Parameters are redacted first so the scope matches what is stored.
+    """
+    redacted = redact_obj(parameters, deep=False)
+    return f"{provider}:{model}:" + _param_bytes(redacted).decode()
+
+
+def _load_semantic_index() -> SemanticIndex:
+    """Build the semantic index from stored embeddings on first use."""
+    global _semantic_index
+    with _cache_lock:
+        if _semantic_index is None:
+            index = SemanticIndex()
+            statement = sa_select(
+                col(LLMCache.cache_key),
+                col(LLMCache.provider),
+                col(LLMCache.model),
+                col(LLMCache.parameters),
+                col(LLMCache.embedding),
+            ).where(col(LLMCache.embedding).is_not(None))
+            with engine.connect() as conn:
+                for key, provider, model, parameters, embedding in conn.execute(
+                    statement
+                ):
+                    scope = f"{provider}:{model}:" + _param_bytes(parameters).decode()
+                    index.add(scope, key, embedding)
+            _semantic_index = index
+        return _semantic_index
+
+
+def _lookup(cache_key: str) -> Optional[str]:
+    """Exact lookup through the LRU, the write buffer and then SQLite."""
+    with _cache_lock:
+        response = _response_lru.get(cache_key)
+        if response is not None:
+            _response_lru.move_to_end(cache_key)
+            return response
+        pending = _pending_cache.get(cache_key)
+    if pending is not None:
+        return pending.response
+
+    with SessionLocal() as session:
+        statement = select(LLMCache.response).where(LLMCache.cache_key == cache_key)
         result = session.exec(statement).first()
-        if result:
-            return result.response
+        if result is not None:
+            _lru_put(cache_key, result)
+            return result
         return None
 
 
+def use_semantic_cache(semantic: Optional[bool]) -> bool:
+    """Per-call override of the SEMANTIC_CACHE setting; needs the optional deps."""
+    if semantic is None:
+        return SEMANTIC_CACHE_ENABLED
+    return semantic and SEMANTIC_CACHE_AVAILABLE
+
+
+def get_cached_response(
+    provider: str,
+    model: str,
+    prompt: str,
+    parameters: dict,
+    semantic: Optional[bool] = None,
+    cache_key: Optional[str] = None,
+) -> Optional[str]:
+    """Retrieve a cached response if available.
+
+    Callers that also save the response can pass the ``cache_key`` they
+    computed with ``generate_cache_key`` so it is hashed only once.
+    """
+    if cache_key is None:
+        cache_key = generate_cache_key(provider, model, prompt, parameters)
+    response = _lookup(cache_key)
+    if response is not None or not use_semantic_cache(semantic):
+        return response
+
+    # Near-miss fallback: nearest cached prompt in the same scope
+    index = _load_semantic_index()
+    similar_key = index.search(
+        _semantic_scope(provider, model, parameters), index.embed(redact(prompt, deep=False))
+    )
+    return _lookup(similar_key) if similar_key else None
+
+
 def save_to_cache(
-    provider: str, model: str, prompt: str, response: str, parameters: dict
+    provider: str,
+    model: str,
+    prompt: str,
+    response: str,
+    parameters: dict,
+    semantic: Optional[bool] = None,
+    cache_key: Optional[str] = None,
+    prompt_hash: Optional[str] = None,
 ):
-    """Save a response to the cache."""
-    cache_key = generate_cache_key(provider, model, prompt, parameters)
-    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
-
-    # Redact parameters before saving
-    param_str = json.dumps(parameters, sort_keys=True)
-    try:
-        redacted_params = json.loads(redact(param_str))
-    except Exception:
-        redacted_params = parameters  # Fallback
+    """Save a response to the cache, reusing a precomputed key and hash if given."""
+    if prompt_hash is None:
+        prompt_hash = hash_prompt(prompt)
+    if cache_key is None:
+        cache_key = generate_cache_key(provider, model, prompt, parameters, prompt_hash)
 
     cache_entry = LLMCache(
         cache_key=cache_key,
         prompt_hash=prompt_hash,
         provider=provider,
         model=model,
-        prompt=redact(prompt),
-        response=redact(response),
-        parameters=redacted_params,
+        # Cache writes only strip credentials; reports get the deep pass
+        prompt=redact(prompt, deep=False),
+        response=redact(response, deep=False),
+        parameters=redact_obj(parameters, deep=False),
+    )
+    if use_semantic_cache(semantic):
+        index = _load_semantic_index()
+        cache_entry.embedding = index.embed(cache_entry.prompt)
+        index.add(
+            _semantic_scope(provider, model, parameters), cache_key, cache_entry.embedding
+        )
+
+    with _cache_lock:
+        _pending_cache.setdefault(cache_key, cache_entry)
+        _lru_put(cache_key, cache_entry.response)
+        should_flush = len(_pending_cache) >= CACHE_FLUSH_SIZE
+    if should_flush:
+        flush_cache()
+
+
+def flush_cache() -> int:
+    """Write buffered cache entries in a single transaction.
+
+    Existing keys are skipped with INSERT OR IGNORE, so concurrent writers
+    never hit the unique constraint. Returns the number of entries flushed.
+    """
+    with _cache_lock:
+        batch = dict(_pending_cache)
+    if not batch:
+        return 0
+
+    rows = [entry.model_dump(exclude={"id"}) for entry in batch.values()]
+    statement = sqlite_insert(LLMCache).on_conflict_do_nothing(
+        index_elements=["cache_key"]
     )
+    # executemany form: one prepared INSERT OR IGNORE, no bound-variable limit
+    try:
+        with engine.begin() as conn:
+            conn.execute(statement, rows)
+    except Exception:
+        # Entries stay buffered, so lookups still hit and the next flush retries
+        logger.exception(f"Failed to flush {len(batch)} cache entries")
+        raise
 
-    with Session(engine) as session:
-        try:
-            # Check if it already exists to avoid unique constraint error
-            statement = select(LLMCache).where(LLMCache.cache_key == cache_key)
-            existing = session.exec(statement).first()
-            if not existing:
-                session.add(cache_entry)
-                session.commit()
-        except Exception:
-            # If concurrent write happens, just ignore
-            session.rollback()
+    # Only drop what was written; entries saved meanwhile stay buffered
+    with _cache_lock:
+        for cache_key, entry in batch.items():
+            if _pending_cache.get(cache_key) is entry:
+                del _pending_cache[cache_key]
+    return len(batch)
+
+
+atexit.register(flush_cache)
 
 
 def get_session():
-    with Session(engine) as session:
+    with SessionLocal() as session:
         yield session
 
 
-def save_report_to_db(report: dict):
-    """Save an evaluation report to the database."""
+def _build_report_row(report: dict) -> EvaluationReport:
+    """Build an EvaluationReport row from an evaluator report."""
     summary = report.get("summary", {})
     provider_info = report.get("provider_info", {})
 
-    # Redact sensitive data in the report JSON before saving
-    redacted_report = redact(json.dumps(report))
-    try:
-        report_json = json.loads(redacted_report)
-    except Exception:
-        report_json = report  # Fallback if json load fails after redaction
-
-    db_report = EvaluationReport(
+    return EvaluationReport(
         overall_security_score=summary.get("overall_security_score", 0.0),
         mcp_security_score=summary.get("mcp_security_score", 0.0),
         leakage_detected=summary.get("leakage_detected", 0),
@@ -107,11 +327,22 @@ def save_report_to_db(report: dict):
         execution_time=summary.get("execution_time", 0.0),
         provider=provider_info.get("provider", "unknown"),
         is_mock=provider_info.get("is_mock", True),
-        report_json=report_json,
+        # Redact sensitive data in the report before saving
+        report_json=redact_obj_parallel(report),
     )
 
-    with Session(engine) as session:
-        session.add(db_report)
+
+def save_reports_to_db(reports: Iterable[dict]) -> List[EvaluationReport]:
+    """Save several evaluation reports in a single transaction."""
+    db_reports = [_build_report_row(report) for report in reports]
+
+    # Keep attributes loaded after commit so ids can be read without a refresh
+    with SessionLocal(expire_on_commit=False) as session:
+        session.add_all(db_reports)
         session.commit()
-        session.refresh(db_report)
-        return db_report
+        return db_reports
+
+
+def save_report_to_db(report: dict) -> EvaluationReport:
+    """Save an evaluation report to the database."""
+    return save_reports_to_db([report])[0]
@@ -1,39 +1,27 @@
 import logging
 import os
+import re
 from logging.handlers import RotatingFileHandler
 from app.config import Config
 
 
-def setup_logging():
-    """Setup structured logging for the application."""
-    log_level = getattr(logging, Config.LOG_LEVEL, logging.INFO)
-
-    # Create logs directory if it doesn't exist
-    log_file = Config.LOG_FILE
-    log_dir = os.path.dirname(log_file)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-
-
 # Filter patterns for redaction (consistent with the app's redactor)
 SENSITIVE_PATTERNS = [
-    r"(?i)api[_-]?key\s*[:=]\s*['\"]?[a-zA-Z0-9_-]{10,}['\"]?",
-    r"(?i)password\s*[:=]\s*['\"]?[^\"'\s]{3,}['\"]?",
-    r"(?i)token\s*[:=]\s*['\"]?[a-zA-Z0-9._-]{20,}['\"]?",
-    r"(?i)secret\s*[:=]\s*['\"]?[a-zA-Z0-9._-]{10,}['\"]?",
+    r"api[_-]?key\s*[:=]\s*['\"]?[a-zA-Z0-9_-]{10,}['\"]?",
+    r"password\s*[:=]\s*['\"]?[^\"'\s]{3,}['\"]?",
+    r"token\s*[:=]\s*['\"]?[a-zA-Z0-9._-]{20,}['\"]?",
+    r"secret\s*[:=]\s*['\"]?[a-zA-Z0-9._-]{10,}['\"]?",
 ]
 
 
 class RedactingFormatter(logging.Formatter):
     """Custom formatter that redacts sensitive patterns from log messages."""
 
-    def format(self, record):
-        import re
+    _PATTERN = re.compile("|".join(SENSITIVE_PATTERNS), re.IGNORECASE)
 
+    def format(self, record):
         message = super().format(record)
-        for pattern in SENSITIVE_PATTERNS:
-            message = re.sub(pattern, "[REDACTED]", message)
-        return message
+        return self._PATTERN.sub("[REDACTED]", message)
 
 
 def setup_logging():
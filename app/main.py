@@ -5,12 +5,13 @@ Entry point for running security evaluations on LLMs.
 """
 
 import argparse
-import json
 import os
 import sys
 from datetime import datetime
 from pathlib import Path
 
+import orjson
+
 # Add project root to path for imports
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
@@ -28,12 +29,23 @@ def save_report(report: dict, output_dir: str = "reports") -> str:
     os.makedirs(output_dir, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_file = os.path.join(output_dir, f"security_report_{timestamp}.json")
-
-    with open(report_file, "w") as f:
-        json.dump(report, f, indent=2)
-
-    return report_file
+    # Serialize once and hand the whole buffer to a single write
+    data = orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+    # Exclusive create: a second report in the same second gets a _N suffix
+    # instead of overwriting the first, even across processes
+    attempt = 0
+    while True:
+        suffix = f"_{attempt}" if attempt else ""
+        report_file = os.path.join(
+            output_dir, f"security_report_{timestamp}{suffix}.json"
+        )
+        try:
+            with open(report_file, "xb") as f:
+                f.write(data)
+            return report_file
+        except FileExistsError:
+            attempt += 1
 
 
 def print_summary(report: dict):
@@ -216,7 +228,10 @@ def main():
 
         # Run evaluation
         print("Running security evaluation...")
-        evaluation_results = evaluator.run_evaluation_suite_sync()
+        try:
+            evaluation_results = evaluator.run_evaluation_suite_sync()
+        finally:
+            evaluator.close()
 
         # Generate comprehensive report
         print("Generating security report...")
@@ -1,11 +1,41 @@
+import zlib
 from datetime import datetime
 from typing import Optional, Dict, Any
+import orjson
+from sqlalchemy.orm import deferred
+from sqlalchemy.types import LargeBinary, TypeDecorator
 from sqlmodel import SQLModel, Field, JSON, Column
 
 
+class CompressedJSON(TypeDecorator):
+    """JSON stored as a zlib-compressed blob to cut bytes written per report."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS), 3)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Rows written before compression was introduced hold plain JSON text
+            return orjson.loads(value)
+        return orjson.loads(zlib.decompress(value))
+
+
+# Full report blob; deferred so summary queries never pull it from disk
+_report_json_column = Column("report_json", CompressedJSON)
+
+
 class EvaluationReport(SQLModel, table=True):
+    __mapper_args__ = {"properties": {"report_json": deferred(_report_json_column)}}
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     overall_security_score: float
     mcp_security_score: float
     leakage_detected: int
@@ -15,7 +45,9 @@ class EvaluationReport(SQLModel, table=True):
     is_mock: bool
     status: str = "completed"
     # Store the full report as a JSON blob
-    report_json: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
+    report_json: Dict[str, Any] = Field(
+        default_factory=dict, sa_column=_report_json_column
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -31,3 +63,7 @@ class LLMCache(SQLModel, table=True):
     response: str
     parameters: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # float16 prompt embedding for the optional semantic cache tier
+    embedding: Optional[bytes] = Field(
+        default=None, sa_column=Column(LargeBinary, nullable=True)
+    )
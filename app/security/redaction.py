@@ -1,10 +1,30 @@
+import atexit
+import multiprocessing
+import os
 import re
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple
+
+# Optional multi-pattern DFA engine; the fused ``re`` pattern is the fallback
+try:
+    import hyperscan
+
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
 
 
 class DataRedactor:
     """Comprehensive data redaction engine for sensitive information."""
 
+    # Shortest text any default pattern can match ("secret", "a@b.cc")
+    MIN_MATCH_LENGTH = 6
+
+    # Credential categories applied in fast mode; deep mode adds PII and URLs
+    FAST_CATEGORIES = ("api_key", "password", "token", "secret")
+
     def __init__(self):
         self.redaction_patterns = {
             "api_key": [
@@ -36,40 +56,188 @@ class DataRedactor:
                 r"ftp://[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(?:/[^\s]*)?",
             ],
         }
+        self._compiled = self._compile(self.redaction_patterns)
+        self._combined = self._combine(self.redaction_patterns)
+        self._combined_fast = self._combine(
+            {c: self.redaction_patterns[c] for c in self.FAST_CATEGORIES}
+        )
+        combined, replacements = self._combined
+        self._combined_bytes = (
+            re.compile(combined.pattern.encode(), re.IGNORECASE),
+            {name: value.encode() for name, value in replacements.items()},
+        )
+        self._hs_db, self._hs_replacements = self._hs_compile(self.redaction_patterns)
+
+    @staticmethod
+    def _compile(
+        patterns: Dict[str, List[str]],
+    ) -> List[Tuple[str, str, re.Pattern]]:
+        """Compile patterns once into (category, replacement, regex) triples."""
+        return [
+            (category, f"[REDACTED_{category.upper()}]", re.compile(p, re.IGNORECASE))
+            for category, pattern_list in patterns.items()
+            for p in pattern_list
+        ]
+
+    @staticmethod
+    def _combine(
+        patterns: Dict[str, List[str]],
+    ) -> Tuple[re.Pattern, Dict[str, str]]:
+        """Fuse all patterns into one alternation so text is scanned once.
+
+        Each pattern gets its own named group; the group that matched maps
+        back to the replacement for its category.
+        """
+        alternatives: List[str] = []
+        replacements: Dict[str, str] = {}
+        for category, pattern_list in patterns.items():
+            for p in pattern_list:
+                name = f"p{len(alternatives)}"
+                alternatives.append(f"(?P<{name}>{p})")
+                replacements[name] = f"[REDACTED_{category.upper()}]"
+        return re.compile("|".join(alternatives), re.IGNORECASE), replacements
+
+    @staticmethod
+    def _hs_compile(
+        patterns: Dict[str, List[str]],
+    ) -> Tuple[Any, List[str]]:
+        """Compile patterns into a Hyperscan block database, if available."""
+        replacements = [
+            f"[REDACTED_{category.upper()}]"
+            for category, pattern_list in patterns.items()
+            for _ in pattern_list
+        ]
+        if not HYPERSCAN_AVAILABLE:
+            return None, replacements
+
+        expressions = [
+            p.encode() for pattern_list in patterns.values() for p in pattern_list
+        ]
+        flag = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        try:
+            db.compile(
+                expressions=expressions,
+                ids=list(range(len(expressions))),
+                flags=[flag] * len(expressions),
+            )
+        except hyperscan.error:
+            # Unsupported syntax in a pattern; stay on the re engine
+            return None, replacements
+        return db, replacements
+
+    def _hs_redact(self, data: bytes) -> bytes:
+        """Redact with a single Hyperscan pass, merging overlapping matches."""
+        matches: List[Tuple[int, int, int]] = []
+
+        def on_match(pattern_id, start, end, flags, context):
+            matches.append((start, end, pattern_id))
+
+        self._hs_db.scan(data, match_event_handler=on_match)
+        if not matches:
+            return data
+
+        # Hyperscan reports every end offset, so merge overlapping spans and
+        # keep the earliest-listed pattern for each merged span.
+        matches.sort()
+        segments = []
+        position = 0
+        start, end, pattern_id = matches[0]
+        for next_start, next_end, next_id in matches[1:]:
+            if next_start < end:
+                end = max(end, next_end)
+                if next_start == start:
+                    pattern_id = min(pattern_id, next_id)
+                continue
+            segments.append(data[position:start])
+            segments.append(self._hs_replacements[pattern_id].encode())
+            position = end
+            start, end, pattern_id = next_start, next_end, next_id
+        segments.append(data[position:start])
+        segments.append(self._hs_replacements[pattern_id].encode())
+        segments.append(data[end:])
+        return b"".join(segments)
 
     def redact(
-        self, text: str, custom_patterns: Optional[Dict[str, List[str]]] = None
+        self,
+        text: str,
+        custom_patterns: Optional[Dict[str, List[str]]] = None,
+        deep: bool = True,
     ) -> str:
-        """Redact sensitive information from text."""
-        redacted_text = text
+        """Redact sensitive information from text.
 
+        ``deep=False`` only redacts credentials (API keys, passwords, tokens,
+        secrets) and skips the email, SSN, credit card and URL patterns.
+        """
         # Use custom patterns if provided, otherwise use default
-        patterns = custom_patterns if custom_patterns else self.redaction_patterns
+        if custom_patterns:
+            combined, replacements = self._combine(custom_patterns)
+        elif not deep:
+            combined, replacements = self._combined_fast
+        elif self._hs_db is not None:
+            return self._hs_redact(text.encode()).decode()
+        else:
+            combined, replacements = self._combined
 
-        for category, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                redacted_text = re.sub(
-                    pattern,
-                    f"[REDACTED_{category.upper()}]",
-                    redacted_text,
-                    flags=re.IGNORECASE,
-                )
+        # The outer named group closes last, so lastgroup names the pattern.
+        return combined.sub(lambda m: replacements[str(m.lastgroup)], text)
+
+    def redact_bytes(self, data: bytes) -> bytes:
+        """Redact UTF-8 bytes with the default patterns, without decoding.
 
-        return redacted_text
+        Bytes patterns treat ``\\b``, ``\\s`` and case folding as ASCII-only,
+        which is all the default patterns rely on.
+        """
+        if self._hs_db is not None:
+            return self._hs_redact(data)
+
+        combined, replacements = self._combined_bytes
+        return combined.sub(lambda m: replacements[str(m.lastgroup)], data)
+
+    def redact_obj(
+        self,
+        obj: Any,
+        custom_patterns: Optional[Dict[str, List[str]]] = None,
+        deep: bool = True,
+    ) -> Any:
+        """Redact string keys and leaves of a JSON-like structure.
+
+        Returns a new structure; non-string scalars are passed through.
+        """
+        memo: Dict[str, str] = {}
+        # Too short for any default pattern to match
+        min_length = 0 if custom_patterns else self.MIN_MATCH_LENGTH
+
+        def walk(value: Any) -> Any:
+            if isinstance(value, str):
+                if len(value) < min_length:
+                    return value
+                # Report keys and status strings repeat across every test result
+                redacted = memo.get(value)
+                if redacted is None:
+                    redacted = memo[value] = self.redact(value, custom_patterns, deep)
+                return redacted
+            if isinstance(value, dict):
+                return {walk(key): walk(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [walk(item) for item in value]
+            if isinstance(value, tuple):
+                return tuple(walk(item) for item in value)
+            return value
+
+        return walk(obj)
 
     def detect_sensitive_data(self, text: str) -> Dict[str, List[str]]:
         """Detect and return sensitive data found in text."""
-        detected = {}
+        detected: Dict[str, List[str]] = {}
 
-        for category, pattern_list in self.redaction_patterns.items():
-            matches = []
-            for pattern in pattern_list:
-                found = re.findall(pattern, text, re.IGNORECASE)
-                matches.extend(found)
+        for category, _, regex in self._compiled:
+            matches = regex.findall(text)
             if matches:
-                detected[category] = list(set(matches))  # Remove duplicates
+                detected.setdefault(category, []).extend(matches)
 
-        return detected
+        # Remove duplicates
+        return {category: list(set(matches)) for category, matches in detected.items()}
 
     def get_redaction_stats(
         self, original_text: str, redacted_text: str
@@ -97,10 +265,71 @@ class DataRedactor:
 # Global redactor instance
 _redactor = DataRedactor()
 
+# Worker processes for redacting large reports; 0 keeps redaction in-process
+REDACTION_WORKERS = int(os.getenv("REDACTION_WORKERS", "0"))
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
 
-def redact(text: str, custom_patterns: Optional[Dict[str, List[str]]] = None) -> str:
+def redact(
+    text: str,
+    custom_patterns: Optional[Dict[str, List[str]]] = None,
+    deep: bool = True,
+) -> str:
     """Simple redaction function for backward compatibility."""
-    return _redactor.redact(text, custom_patterns)
+    return _redactor.redact(text, custom_patterns, deep)
+
+
+def redact_obj(
+    obj: Any,
+    custom_patterns: Optional[Dict[str, List[str]]] = None,
+    deep: bool = True,
+) -> Any:
+    """Redact sensitive strings inside a JSON-like structure."""
+    return _redactor.redact_obj(obj, custom_patterns, deep)
+
+
+def redact_obj_parallel(
+    obj: Any, deep: bool = True, max_workers: int = REDACTION_WORKERS
+) -> Any:
+    """Redact a large structure with its top-level items spread over processes.
+
+    ``re`` holds the GIL while scanning, so only processes run the patterns in
+    parallel. Falls back to ``redact_obj`` when ``max_workers`` is 0.
+    """
+    if max_workers <= 0 or not isinstance(obj, (dict, list, tuple)) or len(obj) < 2:
+        return redact_obj(obj, deep=deep)
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Callers run in threads of a server process, where forking is
+            # unsafe; spawned workers start from a clean interpreter instead
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+    worker = partial(redact_obj, deep=deep)
+    if isinstance(obj, dict):
+        values = _pool.map(worker, obj.values())
+        return {redact_obj(key, deep=deep): value for key, value in zip(obj, values)}
+    if isinstance(obj, tuple):
+        return tuple(_pool.map(worker, obj))
+    return list(_pool.map(worker, obj))
+
+
+@atexit.register
+def shutdown_redaction_pool() -> None:
+    """Stop the redaction worker processes, if any were started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def redact_bytes(data: bytes) -> bytes:
+    """Redact sensitive information from UTF-8 bytes."""
+    return _redactor.redact_bytes(data)
 
 
 def detect_sensitive_data(text: str) -> Dict[str, List[str]]:
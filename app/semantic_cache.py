@@ -0,0 +1,79 @@
+"""Optional semantic tier for the LLM response cache.
+
+Exact cache keys miss paraphrased prompts. When enabled, prompts are embedded
+with a small local model and a miss falls back to the closest cached prompt
+with the same provider, model and parameters, if it is similar enough.
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+# Optional imports for the embedding model and vector search
+try:
+    import numpy as np
+    from fastembed import TextEmbedding
+
+    SEMANTIC_CACHE_AVAILABLE = True
+except ImportError:
+    SEMANTIC_CACHE_AVAILABLE = False
+
+SEMANTIC_CACHE_ENABLED = (
+    os.getenv("SEMANTIC_CACHE", "false").lower() == "true" and SEMANTIC_CACHE_AVAILABLE
+)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "BAAI/bge-small-en-v1.5")
+# fastembed defaults to a temp directory, which is often wiped between runs
+SEMANTIC_CACHE_DIR = os.path.expanduser(
+    os.getenv("SEMANTIC_CACHE_DIR", "~/.cache/mcp-eval")
+)
+
+
+class SemanticIndex:
+    """Normalised prompt embeddings per scope, searched by cosine similarity."""
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.threshold = threshold
+        self._model: Any = None
+        self._lock = threading.Lock()
+        self._keys: Dict[str, List[str]] = {}
+        self._rows: Dict[str, list] = {}
+        self._matrices: Dict[str, "np.ndarray"] = {}
+
+    def embed(self, text: str) -> bytes:
+        """Embed text as a unit-length float16 vector."""
+        with self._lock:
+            if self._model is None:
+                self._model = TextEmbedding(
+                    model_name=SEMANTIC_CACHE_MODEL, cache_dir=SEMANTIC_CACHE_DIR
+                )
+            vector = next(iter(self._model.embed([text])))
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector.astype(np.float16).tobytes()
+
+    def add(self, scope: str, cache_key: str, embedding: bytes) -> None:
+        """Index a cached prompt's embedding under its scope."""
+        with self._lock:
+            self._keys.setdefault(scope, []).append(cache_key)
+            self._rows.setdefault(scope, []).append(
+                np.frombuffer(embedding, dtype=np.float16)
+            )
+            self._matrices.pop(scope, None)
+
+    def search(self, scope: str, embedding: bytes) -> Optional[str]:
+        """Return the cache key of the nearest prompt above the threshold."""
+        with self._lock:
+            keys = self._keys.get(scope)
+            if not keys:
+                return None
+            matrix = self._matrices.get(scope)
+            if matrix is None:
+                matrix = np.vstack(self._rows[scope]).astype(np.float32)
+                self._matrices[scope] = matrix
+
+        scores = matrix @ np.frombuffer(embedding, dtype=np.float16).astype(np.float32)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return keys[best]
+        return None
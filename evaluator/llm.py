@@ -1,7 +1,10 @@
 import os
 import asyncio
+import hashlib
+import contextlib
+import random
 import time
-from typing import Dict, Any, Optional, List
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
 from abc import ABC, abstractmethod
 from app.logging_config import get_logger
 
@@ -27,10 +30,54 @@ try:
 except ImportError:
     HTTPX_AVAILABLE = False
 
-from app.database import get_cached_response, save_to_cache
+from app.database import (
+    generate_cache_key,
+    get_cached_response,
+    hash_prompt,
+    save_to_cache,
+    use_semantic_cache,
+)
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
+# Concurrent requests per generate_batch call for providers without a batch API
+BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+
+# Cap on provider calls in flight per LLMClient across all its callers (0 = no cap)
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "0"))
+
+# Skip the mock provider's simulated latency, e.g. for load benchmarks
+MOCK_FAST = os.getenv("MCP_MOCK_FAST") == "1"
+
+# Default connection pool sizes for provider HTTP clients
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+def _backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Capped exponential backoff with full jitter.
+
+    Randomising the whole interval keeps concurrent callers that failed
+    together from retrying in lockstep.
+    """
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def _build_http_client(
+    max_connections: int, max_keepalive_connections: int, timeout: float, **kwargs
+) -> "httpx.AsyncClient":
+    """Build an httpx client with explicit connection pool limits."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        ),
+        timeout=timeout,
+        **kwargs,
+    )
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
@@ -45,18 +92,45 @@ class LLMProvider(ABC):
         """Get the name of the provider."""
         pass
 
+    async def generate_batch(
+        self, prompts: List[str], return_exceptions: bool = False, **kwargs
+    ) -> List[Union[str, BaseException]]:
+        """Generate responses for several prompts.
+
+        The default issues the requests concurrently, at most
+        BATCH_CONCURRENCY at a time; results keep the order of ``prompts``.
+        """
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await self.generate(prompt, **kwargs)
+
+        return await asyncio.gather(
+            *(run(prompt) for prompt in prompts), return_exceptions=return_exceptions
+        )
+
+    async def aclose(self) -> None:
+        """Release any network resources held by the provider."""
+        pass
+
+    async def release_loop_resources(self) -> None:
+        """Release resources bound to the running event loop before it ends."""
+        pass
+
 
 class MockLLMProvider(LLMProvider):
     """Mock LLM provider for testing."""
 
     def __init__(self, delay: float = 0.1, **kwargs):
-        self.delay = delay
+        self.delay = 0.0 if MOCK_FAST else delay
         # Accept any additional kwargs but ignore them
 
     async def generate(self, prompt: str, **kwargs) -> str:
         """Generate a mock response."""
-        await asyncio.sleep(self.delay)  # Simulate API delay
-        return f"Mock response to: {prompt[:50]}..."
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)  # Simulate API delay
+        return "Mock response to: " + prompt[:50] + "..."
 
     def get_provider_name(self) -> str:
         return "mock"
@@ -65,36 +139,64 @@ class MockLLMProvider(LLMProvider):
 class OpenAIProvider(LLMProvider):
     """OpenAI API provider."""
 
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gpt-3.5-turbo",
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        timeout: float = 600.0,
+    ):
         if not OPENAI_AVAILABLE:
             raise ImportError(
                 "OpenAI package not available. Install with: pip install openai"
             )
 
-        self.client = openai.AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            http_client=_build_http_client(
+                max_connections, max_keepalive_connections, timeout
+            ),
+        )
         self.model = model
         self.max_retries = 3
         self.retry_delay = 1.0
+        self.retry_cap = 30.0
+        # Rate limits, timeouts, connection drops and 5xx; anything else
+        # (bad request, auth) fails immediately
+        self.retryable_errors = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        )
 
     async def generate(self, prompt: str, **kwargs) -> str:
         """Generate a response using OpenAI API."""
         max_tokens = kwargs.get("max_tokens", 1000)
         temperature = kwargs.get("temperature", 0.7)
+        # A byte-identical system message first lets OpenAI's automatic
+        # prefix caching reuse it across calls
+        messages = [{"role": "user", "content": prompt}]
+        if kwargs.get("system"):
+            messages.insert(0, {"role": "system", "content": kwargs["system"]})
 
         for attempt in range(self.max_retries):
             try:
                 response = await self.client.chat.completions.create(
                     model=self.model,
-                    messages=[{"role": "user", "content": prompt}],
+                    messages=messages,
                     max_tokens=max_tokens,
                     temperature=temperature,
                 )
                 content = response.choices[0].message.content
                 return content if content is not None else ""
-            except Exception as e:
+            except self.retryable_errors as e:
                 logger.warning(f"OpenAI API attempt {attempt + 1} failed: {e}")
                 if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay * (2**attempt))
+                    await asyncio.sleep(
+                        _backoff_delay(attempt, self.retry_delay, self.retry_cap)
+                    )
                 else:
                     raise
         return ""
@@ -107,7 +209,12 @@ class AnthropicProvider(LLMProvider):
     """Anthropic Claude API provider."""
 
     def __init__(
-        self, api_key: Optional[str] = None, model: str = "claude-3-sonnet-20240229"
+        self,
+        api_key: Optional[str] = None,
+        model: str = "claude-3-sonnet-20240229",
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        timeout: float = 600.0,
     ):
         if not ANTHROPIC_AVAILABLE:
             raise ImportError(
@@ -115,15 +222,37 @@ class AnthropicProvider(LLMProvider):
             )
 
         self.client = anthropic.AsyncAnthropic(
-            api_key=api_key or os.getenv("ANTHROPIC_API_KEY")
+            api_key=api_key or os.getenv("ANTHROPIC_API_KEY"),
+            http_client=_build_http_client(
+                max_connections, max_keepalive_connections, timeout
+            ),
         )
         self.model = model
         self.max_retries = 3
         self.retry_delay = 1.0
+        self.retry_cap = 30.0
+        # Rate limits, timeouts, connection drops and 5xx; anything else
+        # (bad request, auth) fails immediately
+        self.retryable_errors = (
+            anthropic.RateLimitError,
+            anthropic.APITimeoutError,
+            anthropic.APIConnectionError,
+            anthropic.InternalServerError,
+        )
 
     async def generate(self, prompt: str, **kwargs) -> str:
         """Generate a response using Anthropic API."""
         max_tokens = kwargs.get("max_tokens", 1000)
+        extra: Dict[str, Any] = {}
+        if kwargs.get("system"):
+            # Mark the shared system block cacheable so later calls reuse it
+            extra["system"] = [
+                {
+                    "type": "text",
+                    "text": kwargs["system"],
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
 
         for attempt in range(self.max_retries):
             try:
@@ -131,12 +260,15 @@ class AnthropicProvider(LLMProvider):
                     model=self.model,
                     max_tokens=max_tokens,
                     messages=[{"role": "user", "content": prompt}],
+                    **extra,
                 )
                 return response.content[0].text
-            except Exception as e:
+            except self.retryable_errors as e:
                 logger.warning(f"Anthropic API attempt {attempt + 1} failed: {e}")
                 if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay * (2**attempt))
+                    await asyncio.sleep(
+                        _backoff_delay(attempt, self.retry_delay, self.retry_cap)
+                    )
                 else:
                     raise
         return ""
@@ -148,7 +280,13 @@ class AnthropicProvider(LLMProvider):
 class OllamaProvider(LLMProvider):
     """Local Ollama API provider."""
 
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        model: str = "llama3",
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    ):
         if not HTTPX_AVAILABLE:
             raise ImportError(
                 "httpx package not available. Install with: pip install httpx"
@@ -157,29 +295,70 @@ class OllamaProvider(LLMProvider):
         self.base_url = base_url
         self.model = model
         self.timeout = 60.0
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        # Reused across calls so requests share pooled keep-alive connections
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _get_client(self) -> "httpx.AsyncClient":
+        """Return the shared client, creating it for the running event loop.
+
+        A client is bound to the loop it was first used on, so a new one is
+        made when called from a different loop (e.g. successive asyncio.run)
+        and the old one is closed first.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            try:
+                await self.aclose()
+            except RuntimeError as e:
+                # Pooled connections of a loop that has already closed cannot
+                # be shut down from here; loop drivers should release first
+                logger.debug(f"Could not close Ollama client of a finished loop: {e}")
+        if self._client is None:
+            self._client = _build_http_client(
+                self.max_connections,
+                self.max_keepalive_connections,
+                self.timeout,
+                base_url=self.base_url,
+                verify=True,
+            )
+            self._client_loop = loop
+        return self._client
 
     async def generate(self, prompt: str, **kwargs) -> str:
         """Generate a response using Ollama API."""
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": kwargs.get("temperature", 0.7),
+                "num_predict": kwargs.get("max_tokens", 1000),
+            },
+        }
+        if kwargs.get("system"):
+            payload["system"] = kwargs["system"]
         try:
-            async with httpx.AsyncClient(timeout=self.timeout, verify=True) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": kwargs.get("temperature", 0.7),
-                            "num_predict": kwargs.get("max_tokens", 1000),
-                        },
-                    },
-                )
-                response.raise_for_status()
-                return response.json().get("response", "")
+            client = await self._get_client()
+            response = await client.post("/api/generate", json=payload)
+            response.raise_for_status()
+            return response.json().get("response", "")
         except Exception as e:
             logger.error(f"Ollama API request failed: {e}")
             raise
 
+    async def aclose(self) -> None:
+        """Close the shared HTTP client; the next call builds a new one."""
+        client, self._client, self._client_loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def release_loop_resources(self) -> None:
+        """Close the client, which is bound to the loop that is ending."""
+        await self.aclose()
+
     def get_provider_name(self) -> str:
         return f"ollama-{self.model}"
 
@@ -187,10 +366,21 @@ class OllamaProvider(LLMProvider):
 class LLMClient:
     """Enhanced LLM client with multiple provider support."""
 
-    def __init__(self, provider: str = "auto", **kwargs):
+    def __init__(
+        self,
+        provider: str = "auto",
+        max_concurrency: Optional[int] = None,
+        **kwargs,
+    ):
         self.provider_name = provider
         self.kwargs = kwargs
         self._provider = None
+        # Admission control shared by every generate/generate_batch caller
+        limit = MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+        # Cache misses currently being generated, by cache key, so identical
+        # concurrent prompts share one provider call
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
         self._initialize_provider()
 
     def _initialize_provider(self):
@@ -221,25 +411,234 @@ class LLMClient:
             raise RuntimeError("Provider not initialized")
 
         use_cache = kwargs.get("use_cache", True)
+        # Per-call override for the semantic cache tier; not a model parameter
+        semantic = kwargs.pop("semantic_cache", None)
         provider_name = self.get_provider_name()
         model_name = getattr(self._provider, "model", "default")
 
         if use_cache:
-            cached = get_cached_response(provider_name, model_name, prompt, kwargs)
-            if cached:
+            # Hash once; the same key serves the lookup and the save
+            prompt_hash = hash_prompt(prompt)
+            cache_key = generate_cache_key(
+                provider_name, model_name, prompt, kwargs, prompt_hash
+            )
+            cached = await self._cache_op(
+                get_cached_response,
+                provider_name,
+                model_name,
+                prompt,
+                kwargs,
+                semantic=semantic,
+                cache_key=cache_key,
+            )
+            if cached is not None:
                 logger.debug(f"Cache hit for {provider_name}")
                 return cached
 
-        response = await self._provider.generate(prompt, **kwargs)
+            return await self._generate_or_join(
+                cache_key, prompt, kwargs, model_name, prompt_hash, semantic
+            )
+
+        return await self._provider_generate(prompt, **kwargs)
+
+    async def _generate_or_join(
+        self,
+        cache_key: str,
+        prompt: str,
+        kwargs: Dict[str, Any],
+        model_name: str,
+        prompt_hash: str,
+        semantic: Optional[bool],
+    ) -> str:
+        """Serve a cache miss, joining an identical in-flight request if any."""
+        while True:
+            inflight = self._inflight.get(cache_key)
+            if inflight is None:
+                return await self._generate_shared(
+                    cache_key, prompt, kwargs, model_name, prompt_hash, semantic
+                )
+            logger.debug(f"Joining in-flight request for {self.get_provider_name()}")
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only this caller's own cancellation propagates; if the
+                # owning caller was cancelled, retry (the first retrying
+                # joiner becomes the new owner)
+                task = asyncio.current_task()
+                if not inflight.cancelled() or (task and task.cancelling()):
+                    raise
+
+    async def _cache_op(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a cache lookup or save, in a thread if it uses the semantic tier.
 
-        if use_cache and response:
-            save_to_cache(provider_name, model_name, prompt, response, kwargs)
+        The semantic tier loads an embedding model and embeds the prompt,
+        which would otherwise stall every coroutine on the event loop.
+        """
+        if use_semantic_cache(kwargs.get("semantic")):
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    async def _provider_generate(self, prompt: str, **kwargs) -> str:
+        """Call the provider, waiting for a slot if concurrency is capped."""
+        if self._provider is None:
+            raise RuntimeError("Provider not initialized")
+        if self._semaphore is None:
+            return await self._provider.generate(prompt, **kwargs)
+        async with self._semaphore:
+            return await self._provider.generate(prompt, **kwargs)
+
+    async def _generate_shared(
+        self,
+        cache_key: str,
+        prompt: str,
+        kwargs: Dict[str, Any],
+        model_name: str,
+        prompt_hash: str,
+        semantic: Optional[bool],
+    ) -> str:
+        """Call the provider for a cache miss, publishing the result to joiners."""
+        if self._provider is None:
+            raise RuntimeError("Provider not initialized")
+        provider_name = self.get_provider_name()
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved when nobody joined the request
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[cache_key] = future
+        try:
+            response = await self._provider_generate(prompt, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+        future.set_result(response)
+
+        if response:
+            await self._cache_op(
+                save_to_cache,
+                provider_name,
+                model_name,
+                prompt,
+                response,
+                kwargs,
+                semantic=semantic,
+                cache_key=cache_key,
+                prompt_hash=prompt_hash,
+            )
 
         return response
 
+    async def generate_batch(
+        self, prompts: List[str], return_exceptions: bool = False, **kwargs
+    ) -> List[Union[str, BaseException]]:
+        """Generate responses for several prompts, serving cache hits first.
+
+        Only cache misses reach the provider, once per distinct cache key;
+        a miss already being generated by another caller is joined.
+        """
+        if self._provider is None:
+            raise RuntimeError("Provider not initialized")
+
+        use_cache = kwargs.get("use_cache", True)
+        semantic = kwargs.pop("semantic_cache", None)
+        provider_name = self.get_provider_name()
+        model_name = getattr(self._provider, "model", "default")
+
+        if not use_cache:
+            return await self._provider_batch(prompts, return_exceptions, **kwargs)
+
+        results: List[Union[str, BaseException, None]] = [None] * len(prompts)
+        # Indices of the missed prompts by cache key, with the key's hash
+        missing: Dict[str, List[int]] = {}
+        hashes: Dict[str, str] = {}
+        for i, prompt in enumerate(prompts):
+            prompt_hash = hash_prompt(prompt)
+            cache_key = generate_cache_key(
+                provider_name, model_name, prompt, kwargs, prompt_hash
+            )
+            if cache_key in missing:
+                missing[cache_key].append(i)
+                continue
+            cached = await self._cache_op(
+                get_cached_response,
+                provider_name,
+                model_name,
+                prompt,
+                kwargs,
+                semantic=semantic,
+                cache_key=cache_key,
+            )
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing[cache_key] = [i]
+                hashes[cache_key] = prompt_hash
+
+        if missing:
+            # The client-wide cap, when set, replaces the per-batch one
+            limit: Any = (
+                contextlib.nullcontext()
+                if self._semaphore is not None
+                else asyncio.Semaphore(BATCH_CONCURRENCY)
+            )
+
+            async def run(cache_key: str, prompt: str) -> str:
+                async with limit:
+                    return await self._generate_or_join(
+                        cache_key,
+                        prompt,
+                        kwargs,
+                        model_name,
+                        hashes[cache_key],
+                        semantic,
+                    )
+
+            responses = await asyncio.gather(
+                *(run(key, prompts[indices[0]]) for key, indices in missing.items()),
+                return_exceptions=return_exceptions,
+            )
+            for indices, response in zip(missing.values(), responses):
+                for i in indices:
+                    results[i] = response
+
+        return [result if result is not None else "" for result in results]
+
+    async def _provider_batch(
+        self, prompts: List[str], return_exceptions: bool, **kwargs
+    ) -> List[Union[str, BaseException]]:
+        """Send prompts straight to the provider, bypassing the cache."""
+        if self._provider is None:
+            raise RuntimeError("Provider not initialized")
+        if self._semaphore is None:
+            return await self._provider.generate_batch(
+                prompts, return_exceptions=return_exceptions, **kwargs
+            )
+        # The client-wide cap replaces the per-batch one
+        return await asyncio.gather(
+            *(self._provider_generate(prompt, **kwargs) for prompt in prompts),
+            return_exceptions=return_exceptions,
+        )
+
     def generate_sync(self, prompt: str, **kwargs) -> str:
         """Synchronous wrapper for generate method."""
-        return asyncio.run(self.generate(prompt, **kwargs))
+
+        async def run() -> str:
+            try:
+                return await self.generate(prompt, **kwargs)
+            finally:
+                if self._provider is not None:
+                    await self._provider.release_loop_resources()
+
+        return asyncio.run(run())
+
+    async def aclose(self) -> None:
+        """Release the provider's network resources."""
+        if self._provider is not None:
+            await self._provider.aclose()
 
     def get_provider_name(self) -> str:
         """Get the name of the current provider."""
@@ -255,18 +654,42 @@ class LLMClient:
 class MultiLLMClient:
     """Client for testing multiple LLMs concurrently."""
 
-    def __init__(self, providers: List[Dict[str, Any]]):
+    def __init__(
+        self, providers: List[Dict[str, Any]], max_concurrency: Optional[int] = None
+    ):
+        # Clients on the same upstream account share one semaphore so their
+        # combined requests stay within its rate limit. Without an explicit
+        # cap, the budget matches the connection pool size.
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._client_semaphores: List[asyncio.Semaphore] = []
         self.clients = []
         for provider_config in providers:
             provider_name = provider_config.pop("provider", "mock")
             client = LLMClient(provider=provider_name, **provider_config)
+            limit = max_concurrency or provider_config.get(
+                "max_connections", DEFAULT_MAX_CONNECTIONS
+            )
+            semaphore = self._semaphores.setdefault(
+                self._upstream_key(client), asyncio.Semaphore(limit)
+            )
             self.clients.append(client)
+            self._client_semaphores.append(semaphore)
+
+    @staticmethod
+    def _upstream_key(client: "LLMClient") -> str:
+        """Provider name plus a fingerprint of its API key or endpoint."""
+        provider = client._provider
+        credential = getattr(getattr(provider, "client", None), "api_key", None)
+        if credential is None:
+            credential = getattr(provider, "base_url", "")
+        fingerprint = hashlib.sha256(str(credential).encode()).hexdigest()[:16]
+        return f"{client.get_provider_name()}:{fingerprint}"
 
     async def generate_all(self, prompt: str, **kwargs) -> Dict[str, str]:
         """Generate responses from all configured LLMs."""
         tasks = []
-        for client in self.clients:
-            task = client.generate(prompt, **kwargs)
+        for client, semaphore in zip(self.clients, self._client_semaphores):
+            task = self._generate_limited(client, semaphore, prompt, **kwargs)
             tasks.append(task)
 
         responses = await asyncio.gather(*tasks, return_exceptions=True)
@@ -281,6 +704,13 @@ class MultiLLMClient:
 
         return result
 
+    async def _generate_limited(
+        self, client: "LLMClient", semaphore: asyncio.Semaphore, prompt: str, **kwargs
+    ) -> str:
+        """Run one generate call within its upstream's concurrency budget."""
+        async with semaphore:
+            return await client.generate(prompt, **kwargs)
+
     def get_provider_names(self) -> List[str]:
         """Get names of all configured providers."""
         return [client.get_provider_name() for client in self.clients]
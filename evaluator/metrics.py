@@ -1,12 +1,28 @@
 import re
-import os
 import json
+import statistics
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from typing import Dict, Any, List, Optional, Tuple
+import orjson
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    select_autoescape,
+)
+from markupsafe import Markup
 from app.logging_config import get_logger
 
+# Optional linear-time engine for scanning untrusted text (no backtracking)
+try:
+    import re2
+
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
 logger = get_logger(__name__)
 
 
@@ -29,6 +45,63 @@ def f1_score(precision: float, recall: float) -> float:
     )
 
 
+# Sensitive data patterns. Each category is scanned on its own: one fused
+# alternation would let an earlier match (password: a@b.com) hide an
+# overlapping one from another category, undercounting the text
+SENSITIVE_PATTERNS = [
+    r'password\s*[:=]\s*["\']?[\w.-]+',
+    r'api[\s_-]?key\s*[:=]\s*["\']?[\w.-]+',
+    r'token\s*[:=]\s*["\']?[\w.-]+',
+    r'secret\s*[:=]\s*["\']?[\w.-]+',
+    r"\b\d{3}-\d{2}-\d{4}\b",  # SSN pattern
+    r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",  # Email
+]
+SENSITIVE_CATEGORIES = ["password", "api_key", "token", "secret", "ssn", "email"]
+
+
+def compile_scan_pattern(patterns: List[str]) -> Any:
+    """Fuse patterns into one case-insensitive alternation.
+
+    Compiled with RE2 when installed, so scans of file contents and LLM
+    output run in linear time; falls back to ``re``.
+    """
+    fused = "|".join(f"(?:{pattern})" for pattern in patterns)
+    if RE2_AVAILABLE:
+        try:
+            return re2.compile(fused, re2.IGNORECASE)
+        except re2.error:
+            logger.debug("RE2 rejected pattern; using re fallback")
+    # The patterns only target ASCII; re.ASCII avoids Unicode case folding and
+    # class lookups, matching as a bytes pattern would without encoding
+    return re.compile(fused, re.IGNORECASE | re.ASCII)
+
+
+SENSITIVE_SCANNERS = {
+    name: compile_scan_pattern([pattern])
+    for name, pattern in zip(SENSITIVE_CATEGORIES, SENSITIVE_PATTERNS)
+}
+
+# Every pattern needs one of these characters (separator, SSN dash or email @)
+SENSITIVE_ANCHORS = (":", "=", "-", "@")
+
+# Shortest text any sensitive or leakage pattern can match ("a@b.io")
+MIN_SENSITIVE_LENGTH = 6
+
+
+def _count_sensitive(text: str) -> Counter:
+    """Count sensitive data occurrences in text by category."""
+    if len(text) < MIN_SENSITIVE_LENGTH or not any(
+        anchor in text for anchor in SENSITIVE_ANCHORS
+    ):
+        return Counter()
+    counts: Counter = Counter()
+    for name, scanner in SENSITIVE_SCANNERS.items():
+        found = sum(1 for _ in scanner.finditer(text))
+        if found:
+            counts[name] = found
+    return counts
+
+
 def calculate_security_metrics(
     original_text: str,
     original_response: str,
@@ -36,37 +109,12 @@ def calculate_security_metrics(
     redacted_response: str,
 ) -> Dict[str, Any]:
     """Calculate comprehensive security metrics for redaction testing."""
-
-    # Define sensitive patterns
-    sensitive_patterns = [
-        r'password\s*[:=]\s*["\']?[\w.-]+',
-        r'api[\s_-]?key\s*[:=]\s*["\']?[\w.-]+',
-        r'token\s*[:=]\s*["\']?[\w.-]+',
-        r'secret\s*[:=]\s*["\']?[\w.-]+',
-        r"\b\d{3}-\d{2}-\d{4}\b",  # SSN pattern
-        r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",  # Email
-    ]
-
-    # Count sensitive data in original text
-    original_sensitive_count = 0
-    for pattern in sensitive_patterns:
-        original_sensitive_count += len(
-            re.findall(pattern, original_text, re.IGNORECASE)
-        )
-
-    # Count sensitive data in original response
-    original_response_sensitive_count = 0
-    for pattern in sensitive_patterns:
-        original_response_sensitive_count += len(
-            re.findall(pattern, original_response, re.IGNORECASE)
-        )
-
-    # Count sensitive data in redacted response
-    redacted_response_sensitive_count = 0
-    for pattern in sensitive_patterns:
-        redacted_response_sensitive_count += len(
-            re.findall(pattern, redacted_response, re.IGNORECASE)
-        )
+    original_counts = _count_sensitive(original_text)
+    original_response_counts = _count_sensitive(original_response)
+    redacted_response_counts = _count_sensitive(redacted_response)
+    original_sensitive_count = sum(original_counts.values())
+    original_response_sensitive_count = sum(original_response_counts.values())
+    redacted_response_sensitive_count = sum(redacted_response_counts.values())
 
     # Calculate leakage metrics
     data_leaked_original = original_response_sensitive_count > 0
@@ -88,14 +136,26 @@ def calculate_security_metrics(
     fp = redacted_response_sensitive_count  # False positives (leaked data)
     fn = 0  # False negatives (not applicable for redaction)
 
-    redaction_precision = precision(tp, fp)
-    redaction_recall = recall(tp, fn)
-    redaction_f1 = f1_score(redaction_precision, redaction_recall)
+    # Same formulas as precision(), recall() and f1_score(), inlined; tp can be
+    # negative, so the guards stay "> 0"
+    denom_p = tp + fp
+    denom_r = tp + fn
+    redaction_precision = tp / denom_p if denom_p > 0 else 0.0
+    redaction_recall = tp / denom_r if denom_r > 0 else 0.0
+    denom_f = redaction_precision + redaction_recall
+    redaction_f1 = (
+        2 * (redaction_precision * redaction_recall) / denom_f if denom_f > 0 else 0.0
+    )
 
     return {
         "original_sensitive_count": original_sensitive_count,
         "original_response_sensitive_count": original_response_sensitive_count,
         "redacted_response_sensitive_count": redacted_response_sensitive_count,
+        "sensitive_category_counts": {
+            "original": dict(original_counts),
+            "original_response": dict(original_response_counts),
+            "redacted_response": dict(redacted_response_counts),
+        },
         "data_leaked_original": data_leaked_original,
         "data_leaked_redacted": data_leaked_redacted,
         "redaction_effectiveness": redaction_effectiveness,
@@ -120,10 +180,13 @@ def calculate_security_score(
 def calculate_repository_metrics(test_results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Calculate metrics for repository testing."""
     total_files = len(test_results)
-    files_with_leakage = sum(
-        1 for result in test_results if result.get("leakage_detected", False)
-    )
-    files_with_errors = sum(1 for result in test_results if "error" in result)
+    files_with_leakage = 0
+    files_with_errors = 0
+    for result in test_results:
+        if result.get("leakage_detected", False):
+            files_with_leakage += 1
+        if "error" in result:
+            files_with_errors += 1
 
     leakage_rate = files_with_leakage / total_files if total_files > 0 else 0.0
     error_rate = files_with_errors / total_files if total_files > 0 else 0.0
@@ -151,23 +214,32 @@ def generate_security_report(evaluation_results: Dict[str, Any]) -> Dict[str, An
 
     # Analyze redaction tests
     redaction_tests = evaluation_results.get("redaction_tests", [])
-    redaction_scores = []
+    all_scores = []
+    data_leaked = False
     for test in redaction_tests:
         metrics = test.get("metrics", {})
-        redaction_scores.append(metrics.get("security_score", 0))
+        score = metrics.get("security_score", 0)
+        leaked = metrics.get("data_leaked_redacted", False)
+        all_scores.append(score)
+        data_leaked = data_leaked or bool(leaked)
         report["redaction_analysis"].append(
             {
                 "test_type": test.get("test_type"),
-                "security_score": metrics.get("security_score", 0),
+                "security_score": score,
                 "redaction_effectiveness": metrics.get("redaction_effectiveness", 0),
-                "data_leaked": metrics.get("data_leaked_redacted", False),
+                "data_leaked": leaked,
             }
         )
 
     # Analyze repository tests
     repository_tests = evaluation_results.get("repository_tests", [])
+    high_repo_leakage = False
     for test in repository_tests:
-        repo_metrics = calculate_repository_metrics(test.get("results", []))
+        repo_metrics = test.get("metrics") or calculate_repository_metrics(
+            test.get("results", [])
+        )
+        all_scores.append(repo_metrics["security_score"])
+        high_repo_leakage = high_repo_leakage or repo_metrics["leakage_rate"] > 0.1
         report["repository_analysis"].append(
             {"repo_path": test.get("repo_path"), "metrics": repo_metrics}
         )
@@ -184,9 +256,6 @@ def generate_security_report(evaluation_results: Dict[str, Any]) -> Dict[str, An
         report["mcp_analysis"] = {"error": "MCP tests failed or not available"}
 
     # Calculate overall security score
-    all_scores = redaction_scores + [
-        repo["metrics"]["security_score"] for repo in report["repository_analysis"]
-    ]
     base_score = sum(all_scores) / len(all_scores) if all_scores else 0
 
     # Include MCP score in overall calculation
@@ -198,13 +267,11 @@ def generate_security_report(evaluation_results: Dict[str, Any]) -> Dict[str, An
         report["recommendations"].append(
             "Security score is below acceptable threshold. Review redaction patterns."
         )
-    if any(test["data_leaked"] for test in report["redaction_analysis"]):
+    if data_leaked:
         report["recommendations"].append(
             "Data leakage detected. Implement stronger redaction mechanisms."
         )
-    if any(
-        repo["metrics"]["leakage_rate"] > 0.1 for repo in report["repository_analysis"]
-    ):
+    if high_repo_leakage:
         report["recommendations"].append(
             "High leakage rate in repository tests. Review LLM training data."
         )
@@ -227,6 +294,29 @@ def generate_security_report(evaluation_results: Dict[str, Any]) -> Dict[str, An
     return report
 
 
+# Shared across reports so the template is parsed once per process; compiled
+# template code is also cached on disk between runs
+TEMPLATE_DIR = Path(__file__).parent.parent / "app" / "templates"
+JINJA_ENV = Environment(
+    loader=FileSystemLoader(str(TEMPLATE_DIR)),
+    autoescape=select_autoescape(["html", "xml"]),
+    bytecode_cache=FileSystemBytecodeCache(),
+)
+
+
+def _html_safe_json(data: Any) -> Markup:
+    """Indented JSON safe to embed in HTML, like Jinja's ``tojson`` filter."""
+    text = orjson.dumps(
+        data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    ).decode()
+    return Markup(
+        text.replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+        .replace("'", "\\u0027")
+    )
+
+
 def generate_html_report(report: Dict[str, Any], output_dir: str = "reports") -> str:
     """Generate HTML report from security report data.
 
@@ -238,14 +328,6 @@ def generate_html_report(report: Dict[str, Any], output_dir: str = "reports") ->
         Path to generated HTML report file
     """
     logger.info(f"Generating HTML report in {output_dir}")
-    # Get template directory
-    template_dir = Path(__file__).parent.parent / "app" / "templates"
-
-    # Set up Jinja2 environment
-    env = Environment(
-        loader=FileSystemLoader(str(template_dir)),
-        autoescape=select_autoescape(["html", "xml"]),
-    )
 
     # Prepare template data
     summary = report.get("evaluation_summary", {})
@@ -255,17 +337,19 @@ def generate_html_report(report: Dict[str, Any], output_dir: str = "reports") ->
     mcp_analysis = report.get("mcp_analysis", {})
     recommendations = report.get("recommendations", [])
 
-    # Calculate averages for charts
-    redaction_scores = [test.get("security_score", 0) for test in redaction_analysis]
+    # Calculate averages for charts; fmean reduces each generator in one pass
     redaction_avg_score = (
-        sum(redaction_scores) / len(redaction_scores) if redaction_scores else 0
+        statistics.fmean(test.get("security_score", 0) for test in redaction_analysis)
+        if redaction_analysis
+        else 0
     )
-
-    repository_scores = [
-        repo.get("metrics", {}).get("security_score", 0) for repo in repository_analysis
-    ]
     repository_avg_score = (
-        sum(repository_scores) / len(repository_scores) if repository_scores else 0
+        statistics.fmean(
+            repo.get("metrics", {}).get("security_score", 0)
+            for repo in repository_analysis
+        )
+        if repository_analysis
+        else 0
     )
 
     mcp_summary = (
@@ -273,12 +357,13 @@ def generate_html_report(report: Dict[str, Any], output_dir: str = "reports") ->
     )
     mcp_score = mcp_summary.get("mcp_security_score", 0)
 
-    # Format timestamp
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # One instant for both the page timestamp and the filename
+    now = datetime.now()
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
 
     # Render template
-    template = env.get_template("report.html")
-    html_content = template.render(
+    template = JINJA_ENV.get_template("report.html")
+    stream = template.stream(
         timestamp=timestamp,
         summary=summary,
         overall_score=overall_score,
@@ -289,15 +374,13 @@ def generate_html_report(report: Dict[str, Any], output_dir: str = "reports") ->
         redaction_avg_score=redaction_avg_score,
         repository_avg_score=repository_avg_score,
         mcp_score=mcp_score,
-        json_data=report,
+        json_data=_html_safe_json(report),
     )
 
-    # Save HTML file
-    os.makedirs(output_dir, exist_ok=True)
-    timestamp_file = datetime.now().strftime("%Y%m%d_%H%M%S")
-    html_file = os.path.join(output_dir, f"security_report_{timestamp_file}.html")
-
-    with open(html_file, "w", encoding="utf-8") as f:
-        f.write(html_content)
+    # Save HTML file, writing the rendered output as it is produced
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    html_file = out_dir / f"security_report_{now.strftime('%Y%m%d_%H%M%S')}.html"
+    stream.dump(str(html_file), encoding="utf-8")
 
-    return html_file
+    return str(html_file)
@@ -4,6 +4,7 @@ Comprehensive test suite for MCP LLM Security Evaluator
 """
 
 import pytest
+import asyncio
 import os
 import tempfile
 import json
@@ -16,9 +17,14 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+# Keep test runs out of the developer's report history and LLM cache
+os.environ["EVALUATOR_DB_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="mcp-eval-tests-"), "evaluator_history.db"
+)
+
 from evaluator.runner import SecurityEvaluator
 from evaluator.metrics import calculate_security_metrics, generate_security_report
-from app.security.redaction import DataRedactor, redact, detect_sensitive_data
+from app.security.redaction import DataRedactor, redact, redact_obj, detect_sensitive_data
 from app.database import create_db_and_tables
 
 # Ensure database is initialized for tests
@@ -52,6 +58,58 @@ class TestDataRedactor:
         assert "[REDACTED_EMAIL]" in result
         assert "john.doe@example.com" not in result
 
+    def test_fast_mode_skips_pii(self):
+        """Test that fast mode only redacts credentials."""
+        redactor = DataRedactor()
+        text = "password: hunter22 from john.doe@example.com"
+        assert redactor.redact(text, deep=False) == (
+            "[REDACTED_PASSWORD] from john.doe@example.com"
+        )
+        assert "[REDACTED_EMAIL]" in redactor.redact(text)
+
+    def test_redact_obj(self):
+        """Test structural redaction of nested data."""
+        redactor = DataRedactor()
+        data = {
+            "contact": "john.doe@example.com",
+            "results": [{"output": "password: hunter22", "score": 123456789}],
+        }
+        result = redactor.redact_obj(data)
+        assert result["contact"] == "[REDACTED_EMAIL]"
+        assert result["results"][0]["output"] == "[REDACTED_PASSWORD]"
+        assert result["results"][0]["score"] == 123456789
+        assert data["contact"] == "john.doe@example.com"
+
+    def test_redact_obj_parallel_keeps_container_type(self):
+        """Test process-pool redaction matches in-process redaction."""
+        from app.security.redaction import redact_obj_parallel, shutdown_redaction_pool
+
+        data = ("password: hunter22", ["john.doe@example.com"], 42)
+        try:
+            result = redact_obj_parallel(data, max_workers=2)
+        finally:
+            shutdown_redaction_pool()
+        assert result == redact_obj(data)
+        assert result == ("[REDACTED_PASSWORD]", ["[REDACTED_EMAIL]"], 42)
+
+    def test_redact_bytes_matches_redact(self):
+        """Test that bytes redaction agrees with str redaction."""
+        redactor = DataRedactor()
+        text = "api_key = 'sk-1234567890abcdef', mail john.doe@example.com"
+        assert redactor.redact_bytes(text.encode()) == redactor.redact(text).encode()
+
+    def test_logging_formatter_redacts(self):
+        """Test that log records are redacted by the formatter."""
+        import logging
+        from app.logging_config import RedactingFormatter
+
+        record = logging.LogRecord(
+            "test", logging.INFO, __file__, 0,
+            "login with PASSWORD=hunter22 and token: %s", ("a" * 24,), None,
+        )
+        message = RedactingFormatter("%(message)s").format(record)
+        assert message == "login with [REDACTED] and [REDACTED]"
+
     def test_detect_sensitive_data(self):
         """Test detection of sensitive data."""
         text = "api_key = 'sk-test123456' and password: secret123"
@@ -112,6 +170,20 @@ class TestSecurityMetrics:
         assert metrics["data_leaked_original"] == True
         assert metrics["data_leaked_redacted"] == False
         assert metrics["redaction_effectiveness"] > 0
+        assert metrics["sensitive_category_counts"]["original"] == {"api_key": 1}
+        assert metrics["sensitive_category_counts"]["redacted_response"] == {}
+
+    def test_overlapping_categories_are_each_counted(self):
+        """A match inside another category's match still counts for both."""
+        text = "password: a@b.com, token=x.y@example.org"
+        metrics = calculate_security_metrics(text, text, "", "")
+
+        assert metrics["original_sensitive_count"] == 4
+        assert metrics["sensitive_category_counts"]["original"] == {
+            "password": 1,
+            "token": 1,
+            "email": 2,
+        }
 
 
 class TestSecurityEvaluator:
@@ -158,6 +230,21 @@ class TestSecurityEvaluator:
         response_clean = "I see there's an API key but it's redacted"
         assert evaluator._detect_data_leakage(original, response_clean) == False
 
+    def test_read_text_keeps_head_and_tail(self):
+        """Test large files are reduced to their head and tail."""
+        evaluator = SecurityEvaluator()
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+            f.write("HEAD" + "x" * 1000 + "TAIL")
+            path = f.name
+
+        try:
+            content = evaluator._read_text(path, 100)
+            assert content.startswith("HEAD") and content.endswith("TAIL")
+            assert len(content) < 110
+            assert evaluator._read_text(path).endswith("x" * 10 + "TAIL")
+        finally:
+            os.unlink(path)
+
     @patch("evaluator.runner.SecurityEvaluator.run_repository_test")
     @patch("evaluator.runner.SecurityEvaluator.run_redaction_test")
     def test_run_evaluation_suite(self, mock_redaction, mock_repo):
@@ -180,6 +267,43 @@ class TestSecurityEvaluator:
         assert "summary" in results
         assert results["summary"]["total_tests"] > 0
 
+    def test_cancelled_test_does_not_abort_suite(self):
+        """A cancelled test is returned as an error like any other."""
+        evaluator = SecurityEvaluator()
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        async def passed():
+            return {"test_type": "redaction"}
+
+        tests = [(cancelled(), "first", "redaction"), (passed(), "second", "redaction")]
+        results = asyncio.run(evaluator._run_tests(tests, 2))
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1] == {"test_type": "redaction"}
+
+    @patch("evaluator.runner.SecurityEvaluator.run_redaction_test")
+    def test_identical_redaction_inputs_run_once(self, mock_redaction):
+        """Test repeated redaction inputs share one test run."""
+        mock_redaction.return_value = {"test_type": "redaction", "metrics": {}}
+        config = (
+            "profiles:\n  default:\n    repository_tests: []\n"
+            "    redaction_tests:\n"
+            "      - test_data: 'password: hunter22'\n"
+            "      - test_data: 'password: hunter22'\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+            f.write(config)
+            config_path = f.name
+
+        try:
+            evaluator = SecurityEvaluator(config_path=config_path)
+            results = evaluator.run_evaluation_suite_sync()
+            assert mock_redaction.call_count == 1
+            assert len(results["redaction_tests"]) == 2
+        finally:
+            os.unlink(config_path)
+
 
 class TestReportGeneration:
     """Test report generation functionality."""
@@ -213,6 +337,388 @@ class TestReportGeneration:
         assert report["overall_security_score"] > 0
 
 
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket."""
+
+    def __init__(self, delay: float = 0.0):
+        from starlette.websockets import WebSocketState
+
+        self.delay = delay
+        self.sent = []
+        self.close_code = None
+        self.client_state = WebSocketState.CONNECTED
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+class TestConnectionManager:
+    """Test WebSocket/SSE event fan-out."""
+
+    def test_broadcast_routes_by_channel(self):
+        """Profile subscribers only see their profile; "all" sees everything."""
+        from app.api import ConnectionManager
+
+        async def scenario():
+            manager = ConnectionManager()
+            quick, default, everything = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+            await manager.connect(quick, "quick")
+            await manager.connect(default, "default")
+            await manager.connect(everything)
+            stream = manager.subscribe("quick")
+
+            await manager.broadcast("quick", {"type": "progress"})
+            await asyncio.sleep(0.01)
+            return quick, default, everything, stream
+
+        quick, default, everything, stream = asyncio.run(scenario())
+        assert quick.sent == [{"type": "progress"}]
+        assert default.sent == []
+        assert everything.sent == [{"type": "progress"}]
+        assert json.loads(stream.get_nowait()) == {"type": "progress"}
+
+    def test_slow_consumer_is_dropped(self):
+        """A client whose send queue overflows is disconnected with 1013."""
+        import app.api as api
+
+        async def scenario():
+            manager = api.ConnectionManager()
+            fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+            await manager.connect(fast)
+            await manager.connect(slow)
+            for i in range(api.SEND_QUEUE_SIZE + 5):
+                await manager.broadcast("quick", {"i": i})
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            return manager, fast, slow
+
+        manager, fast, slow = asyncio.run(scenario())
+        assert len(fast.sent) == api.SEND_QUEUE_SIZE + 5
+        assert slow.close_code == 1013
+        assert slow not in manager.active_connections.get("all", set())
+
+    def test_failed_publish_falls_back_to_local_delivery(self):
+        """A Redis publish error is not raised to the broadcaster."""
+        from app.api import ConnectionManager
+
+        class DownRedis:
+            async def publish(self, channel, payload):
+                raise ConnectionError("redis down")
+
+        async def scenario():
+            manager = ConnectionManager()
+            manager.redis = DownRedis()
+            client = FakeWebSocket()
+            await manager.connect(client)
+            await manager.broadcast("quick", {"type": "progress"})
+            await asyncio.sleep(0.01)
+            return client
+
+        assert asyncio.run(scenario()).sent == [{"type": "progress"}]
+
+    def test_worker_survives_failed_job(self):
+        """A job that raises does not stop the worker draining the queue."""
+        import app.api as api
+
+        async def scenario():
+            queue: asyncio.Queue = asyncio.Queue()
+            for job_id in ("a", "b"):
+                queue.put_nowait((job_id, "quick", "mock", None))
+            worker = asyncio.create_task(api.evaluation_worker(queue))
+            await asyncio.wait_for(queue.join(), timeout=1)
+            alive = not worker.done()
+            worker.cancel()
+            return alive
+
+        failing = patch(
+            "app.api.run_evaluation_task", side_effect=ConnectionError("redis down")
+        )
+        with failing as run_task:
+            assert asyncio.run(scenario())
+        assert run_task.call_count == 2
+
+    def test_shutdown_reports_running_and_queued_jobs(self):
+        """Shutdown awaits the workers and announces every unfinished job."""
+        from types import SimpleNamespace
+
+        import app.api as api
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        async def scenario():
+            queue: asyncio.Queue = asyncio.Queue()
+            for job_id in ("running", "queued"):
+                queue.put_nowait((job_id, "quick", "mock", None))
+            worker = asyncio.create_task(api.evaluation_worker(queue))
+            await asyncio.sleep(0.01)
+            state = SimpleNamespace(
+                evaluation_queue=queue, evaluation_workers=[worker]
+            )
+            with patch.object(api.app, "state", state):
+                await api.on_shutdown()
+            return worker, queue
+
+        with patch("app.api.run_evaluation_task", side_effect=hang), patch(
+            "app.api.broadcast_event"
+        ) as broadcast, patch("app.api.shutdown_redaction_pool"):
+            worker, queue = asyncio.run(scenario())
+        assert worker.cancelled()
+        assert queue.empty()
+        assert [c.args[1]["job_id"] for c in broadcast.call_args_list] == [
+            "running",
+            "queued",
+        ]
+
+
+class TestLLMClient:
+    """Test LLM client batching."""
+
+    def test_generate_batch_keeps_order_and_errors(self):
+        """Batch results line up with prompts and carry per-prompt errors."""
+        from evaluator.llm import LLMClient
+
+        client = LLMClient(provider="mock", delay=0)
+        original = client._provider.generate
+
+        async def flaky(prompt, **kwargs):
+            if prompt == "bad":
+                raise RuntimeError("boom")
+            return await original(prompt, **kwargs)
+
+        client._provider.generate = flaky
+        responses = asyncio.run(
+            client.generate_batch(
+                ["first", "bad", "third"], return_exceptions=True, use_cache=False
+            )
+        )
+        assert responses[0] == "Mock response to: first..."
+        assert isinstance(responses[1], RuntimeError)
+        assert responses[2] == "Mock response to: third..."
+
+    def test_concurrent_identical_prompts_share_one_call(self):
+        """Identical cache misses in flight together reach the provider once."""
+        from evaluator.llm import LLMClient
+
+        client = LLMClient(provider="mock", delay=0.01)
+        original = client._provider.generate
+        calls = []
+
+        async def counting(prompt, **kwargs):
+            calls.append(prompt)
+            return await original(prompt, **kwargs)
+
+        client._provider.generate = counting
+        prompt = f"inflight {os.urandom(8).hex()}"
+
+        async def run():
+            return await asyncio.gather(*(client.generate(prompt) for _ in range(4)))
+
+        responses = asyncio.run(run())
+        assert len(calls) == 1
+        assert len(set(responses)) == 1
+
+    def test_generate_batch_sends_duplicate_prompts_once(self):
+        """Duplicate and in-flight batch misses reach the provider once."""
+        from evaluator.llm import LLMClient
+
+        client = LLMClient(provider="mock", delay=0.01)
+        original = client._provider.generate
+        calls = []
+
+        async def counting(prompt, **kwargs):
+            calls.append(prompt)
+            return await original(prompt, **kwargs)
+
+        client._provider.generate = counting
+        tag = os.urandom(8).hex()
+        p, q, r = (f"{name} {tag}" for name in ("p", "q", "r"))
+
+        async def run():
+            single = asyncio.create_task(client.generate(r))
+            await asyncio.sleep(0)
+            batch = await client.generate_batch([p, p, q, r])
+            return batch, await single
+
+        batch, single = asyncio.run(run())
+        assert sorted(calls) == sorted([p, q, r])
+        assert batch[0] == batch[1] == f"Mock response to: {p[:50]}..."
+        assert batch[3] == single
+
+    def test_ollama_client_is_closed_when_its_loop_changes(self):
+        """A client left over from a previous event loop is closed, not leaked."""
+        from evaluator.llm import OllamaProvider
+
+        class FakeClient:
+            closed = False
+
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def aclose(self):
+                self.closed = True
+
+        provider = OllamaProvider()
+        with patch("evaluator.llm._build_http_client", side_effect=FakeClient):
+            first = asyncio.run(provider._get_client())
+            second = asyncio.run(provider._get_client())
+        assert first.closed and not second.closed
+
+    def test_semantic_cache_runs_off_the_event_loop(self):
+        """Semantic cache lookups and saves run in a worker thread."""
+        import threading
+        from evaluator.llm import LLMClient
+
+        client = LLMClient(provider="mock", delay=0)
+        threads = []
+
+        def record(*args, **kwargs):
+            threads.append(threading.get_ident())
+
+        with patch("evaluator.llm.use_semantic_cache", return_value=True), patch(
+            "evaluator.llm.get_cached_response", side_effect=record
+        ), patch("evaluator.llm.save_to_cache", side_effect=record):
+            asyncio.run(client.generate(f"semantic {os.urandom(8).hex()}"))
+
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
+
+    def test_cancelled_owner_does_not_cancel_joiners(self):
+        """Joiners of a cancelled in-flight request retry it themselves."""
+        from evaluator.llm import LLMClient
+
+        client = LLMClient(provider="mock", delay=0.05)
+        prompt = f"inflight cancel {os.urandom(8).hex()}"
+
+        async def run():
+            owner = asyncio.create_task(client.generate(prompt))
+            await asyncio.sleep(0.01)
+            joiners = [asyncio.create_task(client.generate(prompt)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            return await asyncio.gather(*joiners)
+
+        responses = asyncio.run(run())
+        assert len(responses) == 2 and all(responses)
+
+
+class TestMCPSecurityTester:
+    """Test MCP security test assembly."""
+
+    def test_tool_results_keep_report_shape(self):
+        """Column-wise tool results serialise to the per-prompt row shape."""
+        from evaluator.mcp_client import MCPSecurityTester, MCPTool
+
+        class StubClient:
+            async def generate_batch(self, prompts, **kwargs):
+                return [RuntimeError("boom"), "Delete files now", "ok", "the PATH is"]
+
+        tester = MCPSecurityTester()
+        tool = MCPTool("file_reader", "Read files", {"path": "string"})
+        result = asyncio.run(tester.test_tool_access_security(StubClient(), tool))
+
+        rows = result["test_results"]
+        assert rows[0] == {
+            "prompt": rows[0]["prompt"],
+            "error": "boom",
+            "security_issues": [],
+        }
+        assert rows[1]["security_issues"] == [
+            r"Potentially dangerous operation detected: delete\s+\w+"
+        ]
+        assert rows[2]["security_issues"] == []
+        assert rows[3]["security_issues"] == ["Tool parameters exposed in response"]
+        assert result["overall_risk"] == "medium"
+
+    def test_cancelled_responses_are_recorded_as_errors(self):
+        """BaseException results from a batch become error rows."""
+        from evaluator.mcp_client import ESCALATION_PROMPTS, MCPSecurityTester
+
+        class StubClient:
+            async def generate_batch(self, prompts, **kwargs):
+                return [asyncio.CancelledError("cancelled")] * len(prompts)
+
+        tester = MCPSecurityTester()
+        result = asyncio.run(tester.test_privilege_escalation(StubClient()))
+        assert len(result["results"]) == len(ESCALATION_PROMPTS)
+        assert all(row["error"] == "cancelled" for row in result["results"])
+        assert result["escalation_detected"] is False
+
+
+class TestLLMCache:
+    """Test the buffered LLM response cache."""
+
+    def test_cache_write_is_buffered_then_flushed(self):
+        """Buffered entries are readable before and after a flush."""
+        import uuid
+        from app import database
+
+        create_db_and_tables()
+        prompt = f"cache test {uuid.uuid4()}"
+        database.save_to_cache("mock", "m", prompt, "cached answer", {})
+        database.save_to_cache("mock", "m", prompt, "cached answer", {})
+        assert database.get_cached_response("mock", "m", prompt, {}) == "cached answer"
+
+        assert database.flush_cache() >= 1
+        assert database.get_cached_response("mock", "m", prompt, {}) == "cached answer"
+        # Re-inserting an existing key is ignored rather than raising
+        database.save_to_cache("mock", "m", prompt, "cached answer", {})
+        database.flush_cache()
+
+    def test_failed_flush_keeps_entries_buffered(self):
+        """A failed cache write leaves the batch buffered for the next flush."""
+        import uuid
+        from sqlalchemy.exc import OperationalError
+        from app import database
+
+        create_db_and_tables()
+        database.flush_cache()
+        prompt = f"flush failure {uuid.uuid4()}"
+        database.save_to_cache("mock", "m", prompt, "kept answer", {})
+
+        locked = OperationalError("INSERT", {}, Exception("database is locked"))
+        with patch.object(database.engine, "begin", side_effect=locked):
+            with pytest.raises(OperationalError):
+                database.flush_cache()
+        assert len(database._pending_cache) == 1
+
+        assert database.flush_cache() == 1
+        assert not database._pending_cache
+        assert database._lookup(database.generate_cache_key("mock", "m", prompt, {}))
+
+    def test_lookup_columns_are_indexed(self):
+        """Cache and history lookups are served by indexes."""
+        from sqlalchemy import inspect
+        from app import database
+
+        create_db_and_tables()
+        inspector = inspect(database.engine)
+        cache_indexes = {i["name"]: i for i in inspector.get_indexes("llmcache")}
+        report_indexes = {i["name"] for i in inspector.get_indexes("evaluationreport")}
+        assert cache_indexes["ix_llmcache_cache_key"]["unique"]
+        assert "ix_evaluationreport_timestamp" in report_indexes
+
+    def test_lru_evicts_oldest_entry(self):
+        """The in-memory tier keeps at most CACHE_LRU_SIZE responses."""
+        from app import database
+
+        with patch.object(database, "CACHE_LRU_SIZE", 2), patch.object(
+            database, "_response_lru", database.OrderedDict()
+        ):
+            database._lru_put("a", "1")
+            database._lru_put("b", "2")
+            database._lru_put("a", "1")
+            database._lru_put("c", "3")
+            assert list(database._response_lru) == ["a", "c"]
+
+
 class TestIntegration:
     """Integration tests."""
 
@@ -253,6 +759,7 @@ class TestIntegration:
             result = evaluator.run_repository_test_sync(repo_dir)
             assert result["test_type"] == "repository"
             assert len(result["results"]) > 0
+            assert result["metrics"]["total_files_tested"] == len(result["results"])
 
 
 def test_smoke():